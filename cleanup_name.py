@@ -13,12 +13,29 @@ Update Date: 03.05.25
 Description:
 
     Cleanup selected clip names.  Remove all symbols and convert all spaces to
-    underscores.
+    underscores.  Presets can also convert to plain ASCII, force lower or upper case
+    and limit the length, leaving version tags like v003 alone.
+
+    Selected libraries, folders, reel groups, reels and desktops are searched for
+    clips and sequences, so a whole library can be cleaned up at once.
 
 Menus:
 
-    Right-click selected clips on the Desktop -> Edit... -> Cleanup Name
-    Right-click selected clips in the Media Panel -> Edit... -> Cleanup Name
+    Right-click selected clips or reels on the Desktop -> Edit... -> Cleanup Name
+    Right-click selected clips, folders or libraries in the Media Panel -> Edit... ->
+        Cleanup Name
+    Right-click selected clips, folders or libraries in the Media Panel -> Edit... ->
+        Apply Rename Plan
+    Right-click in the Media Panel -> Edit... -> Revert Last Cleanup Name
+
+Command Line:
+
+    The same cleanup can be run outside of Flame, reading names one per line from
+    files or stdin and writing the cleaned up names to stdout.
+
+    python cleanup_name.py names.txt > clean_names.txt
+    python cleanup_name.py --csv --column 1 --header shots.csv
+    python cleanup_name.py --plan names.txt > cleanup_name_plan.jsonl
 
 To Install:
 
@@ -29,10 +46,29 @@ To Install:
     /opt/Autodesk/user/<user name>/python
 """
 
-from functools import partial
-
-import flame
-from PySide6 import QtCore, QtGui, QtWidgets
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial
+from itertools import chain, islice
+
+try:
+    import flame
+except ImportError:  # Running outside of Flame, see main().
+    flame = None
+
+# PySide6 and the widget classes are loaded by load_ui().
+QtCore = QtGui = QtWidgets = None
+
+# Lists of (clip, old name, new name) renames made this session, newest last.  Only
+# the last JOURNAL_RUNS are kept, as they hold on to the clips.  The journal file keeps
+# every rename.
+JOURNAL = []
+JOURNAL_RUNS = 10
 
 TITLE = 'Cleanup Name'
 VERSION_INFO = (2, 0, 0)
@@ -41,336 +77,1188 @@ VERSION_TITLE = f'{TITLE} v{VERSION}'
 
 MESSAGE_PREFIX = '[PYTHON]'
 
+# Maximum number of cleaned names remembered for the rest of the Flame session.
+CACHE_SIZE = 65536
+
+# Set the CLEANUP_NAME_DISK_CACHE environment variable to also keep the names cleaned in
+# the window in a database in the user folder, so they outlive the Flame session.  The
+# command line never uses it.  At most DISK_CACHE_SIZE names are kept, the ones written
+# longest ago are removed first.
+DISK_CACHE = bool(os.environ.get('CLEANUP_NAME_DISK_CACHE'))
+DISK_CACHE_SIZE = 1000000
+
+# Number of clips read or renamed at a time.
+CHUNK_SIZE = 250
+
+# Seconds spent reading clip names between updates of the window.
+LOAD_TIME = 0.05
+
+# Milliseconds after the last key press in the filter before the list is filtered.
+FILTER_DELAY = 150
+
+# Per user folder for files written by the script, the same as the user python folder.
+USER_DIR = os.path.expanduser(
+        '~/Library/Preferences/Autodesk/flame/python' if sys.platform == 'darwin'
+        else '~/flame/python')
+
+# Every rename is appended to this file, one JSON list per line of [run time, action,
+# index within the run, clip uid or null, old name, new name].  The action is cleanup,
+# revert or plan.  Once the file reaches JOURNAL_SIZE bytes it is moved aside to .1 and
+# up to JOURNAL_COUNT older files are kept, like the stats log.
+JOURNAL_PATH = os.path.join(USER_DIR, 'cleanup_name_journal.jsonl')
+JOURNAL_SIZE = 16 << 20
+JOURNAL_COUNT = 3
+
+DISK_CACHE_PATH = os.path.join(USER_DIR, 'cleanup_name_cache.sqlite')
+
+# Rename plans written by Export Plan and read by Apply Rename Plan, one JSON list per
+# line of [clip uid or null, original name, clean name, changed].
+PLAN_PATH = os.path.join(USER_DIR, 'cleanup_name_plan.jsonl')
+PLAN_FILTER = 'Rename Plans (*.jsonl)'
+
+# Names looked up in the disk cache per query, below the oldest sqlite variable limit.
+DISK_CACHE_BATCH = 900
+
+# Bytes of journal lines held in memory between writes to the journal file.
+JOURNAL_BUFFER = 1 << 20
+
+# Names sent to a worker process at a time by cleanup_parallel.
+PARALLEL_CHUNK_SIZE = 20000
+
+# Fewer names than this are cleaned in one process.  Starting the workers would cost
+# more than it saves.
+PARALLEL_MINIMUM = 200000
+
+# Print every rename to the shell instead of only a summary.
+VERBOSE = False
+
+# Print how long each rule of the preset takes on the selected names.
+TIME_RULES = False
+
+# Set the CLEANUP_NAME_STATS environment variable to print one JSON line of phase
+# timings and counts for every run.  Set CLEANUP_NAME_STATS_LOG to a file path to also
+# append the lines to that file, which is rotated after STATS_LOG_SIZE bytes.
+STATS_LOG = os.environ.get('CLEANUP_NAME_STATS_LOG')
+STATS = bool(os.environ.get('CLEANUP_NAME_STATS') or STATS_LOG)
+STATS_LOG_SIZE = 1 << 20
+STATS_LOG_COUNT = 3
+
+# Ways to tell apart clips that clean up to the same name.  Suffix format and the first
+# number to use, or None to leave the duplicates as they are.
+DUPLICATE_POLICIES = {
+    'Keep Duplicates': None,
+    'Add _v2': ('_v{}', 2),
+    'Add _001': ('_{:03d}', 1),
+}
+
+# Flame objects that are searched for clips instead of being renamed, and the
+# attributes listing what is inside of them.  Not every type has every attribute.
+# Sequences are renamed like clips and also searched for the segments on their tracks.
+CONTAINER_TYPES = ('PyDesktop', 'PyLibrary', 'PyFolder', 'PyReelGroup', 'PyReel')
+CONTAINER_ATTRIBUTES = ('clips', 'sequences', 'reels', 'reel_groups', 'folders')
+
+# Longest name left by the truncate rule.
+MAX_LENGTH = 64
+
+# Any run of symbols, whitespace or underscores.
+SEPARATORS = re.compile(r'[\W_]+')
+
+# Byte translation table that turns every ASCII symbol and whitespace into an
+# underscore.
+ASCII_SEPARATORS = bytes(
+        num if re.match(r'\w', chr(num), re.ASCII) else ord('_') for num in range(256))
+
+# Letters that have no ASCII letter in their Unicode decomposition, so would otherwise
+# be dropped by transliterate, like the ss in Straße.
+TRANSLITERATIONS = str.maketrans({
+    'ß': 'ss', 'ẞ': 'SS', 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE',
+    'ø': 'o', 'Ø': 'O', 'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D',
+    'ð': 'd', 'Ð': 'D', 'þ': 'th', 'Þ': 'Th', 'ħ': 'h', 'Ħ': 'H',
+    'ı': 'i', 'ŋ': 'ng', 'Ŋ': 'NG', 'ŧ': 't', 'Ŧ': 'T', 'ƒ': 'f',
+})
+
+# Tokens left alone by the case and truncate rules, like the version tag in shot_v003.
+PROTECTED_TOKENS = re.compile(r'(?<![^_])(v\d+)(?![^_])')
+
+
+def transliterate(text):
+    """Returns text with accented and other non-ASCII letters swapped for ASCII.
+
+    Letters with no ASCII equivalent, like those of Chinese or Japanese, are dropped
+    and may leave nothing of the name.
+    """
+    if text.isascii():
+        return text
+    text = text.translate(TRANSLITERATIONS)
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
 
-class FlameButton(QtWidgets.QPushButton):
-    """Custom Qt Flame Button Widget v2.1
 
-    button_name: button text [str]
-    connect: execute when clicked [function]
-    button_color: (optional) normal, blue [str]
-    button_width: (optional) default is 150 [int]
-    button_max_width: (optional) default is 150 [int]
+def sanitize(text):
+    """Returns text with symbols and whitespace replaced by underscores.
 
-    Usage:
+    Every run of symbols, whitespace and underscores becomes a single underscore, then
+    any underscore left at the start or end is removed.
 
-        button = FlameButton(
-            'Button Name', do_something__when_pressed, button_color='blue')
+    Plain ASCII names, the usual case, skip the regex.  The symbols are turned into
+    underscores with a byte translation table and the runs collapsed with replace.
     """
+    if text.isascii():
+        tidy = text.encode('ascii').translate(ASCII_SEPARATORS)
+        while b'__' in tidy:
+            tidy = tidy.replace(b'__', b'_')
+        return tidy.strip(b'_').decode('ascii')
+
+    return SEPARATORS.sub('_', text).strip('_')
+
+
+def lowercase(text):
+    """Returns text in lowercase, except for protected tokens."""
+    parts = PROTECTED_TOKENS.split(text)
+    parts[::2] = [part.lower() for part in parts[::2]]
+    return ''.join(parts)
 
-    def __init__(self, button_name, connect, button_color='normal', button_width=150,
-                 button_max_width=150):
-        super().__init__()
-
-        self.setText(button_name)
-        self.setMinimumSize(QtCore.QSize(button_width, 28))
-        self.setMaximumSize(QtCore.QSize(button_max_width, 28))
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.clicked.connect(connect)
-        if button_color == 'normal':
-            self.setStyleSheet("""
-                QPushButton {
-                    color: rgb(154, 154, 154);
-                    background-color: rgb(58, 58, 58);
-                    border: none;
-                    font: 14px 'Discreet'}
-                QPushButton:hover {
-                    border: 1px solid rgb(90, 90, 90)}
-                QPushButton:pressed {
-                    color: rgb(159, 159, 159);
-                    background-color: rgb(66, 66, 66);
-                    border: 1px solid rgb(90, 90, 90)}
-                QPushButton:disabled {
-                    color: rgb(116, 116, 116);
-                    background-color: rgb(58, 58, 58);
-                    border: none}
-                QToolTip {
-                    color: rgb(170, 170, 170);
-                    background-color: rgb(71, 71, 71);
-                    border: 10px solid rgb(71, 71, 71)}""")
-        elif button_color == 'blue':
-            self.setStyleSheet("""
-                QPushButton {
-                    color: rgb(190, 190, 190);
-                    background-color: rgb(0, 110, 175);
-                    border: none;
-                    font: 12px 'Discreet'}
-                QPushButton:hover {
-                    border: 1px solid rgb(90, 90, 90)}
-                QPushButton:pressed {
-                    color: rgb(159, 159, 159);
-                    border: 1px solid rgb(90, 90, 90)
-                QPushButton:disabled {
-                    color: rgb(116, 116, 116);
-                    background-color: rgb(58, 58, 58);
-                    border: none}
-                QToolTip {
-                    color: rgb(170, 170, 170);
-                    background-color: rgb(71, 71, 71);
-                    border: 10px solid rgb(71, 71, 71)}""")
-
-
-class FlameLabel(QtWidgets.QLabel):
-    """Custom Qt Flame Label Widget v2.1
-
-    label_name:  text displayed [str]
-    label_type:  (optional) select from different styles:
-                 normal, underline, background. default is normal [str]
-    label_width: (optional) default is 150 [int]
-
-    Usage:
-
-        label = FlameLabel('Label Name', 'normal', 300)
+
+def uppercase(text):
+    """Returns text in uppercase, except for protected tokens."""
+    parts = PROTECTED_TOKENS.split(text)
+    parts[::2] = [part.upper() for part in parts[::2]]
+    return ''.join(parts)
+
+
+def truncate(text):
+    """Returns text cut down to MAX_LENGTH, keeping a protected token at the end.
+
+    A token too long to fit is cut like the rest of the name.
+    """
+    if len(text) <= MAX_LENGTH:
+        return text
+
+    tail = ''
+    for match in PROTECTED_TOKENS.finditer(text):
+        if match.end() == len(text) and len(match.group()) < MAX_LENGTH:
+            tail = '_' + match.group()
+
+    head = text[:max(MAX_LENGTH - len(tail), 0)]
+    return (head.rstrip('_') + tail).strip('_')
+
+
+RULES = {
+    'transliterate': transliterate,
+    'sanitize': sanitize,
+    'lowercase': lowercase,
+    'uppercase': uppercase,
+    'truncate': truncate,
+}
+
+# Rules applied in order by each preset.  The first preset is the default.
+PRESETS = {
+    'Default': ('sanitize',),
+    'ASCII': ('transliterate', 'sanitize'),
+    'ASCII Lowercase': ('transliterate', 'sanitize', 'lowercase'),
+    'ASCII Uppercase': ('transliterate', 'sanitize', 'uppercase'),
+    'ASCII Max Length': ('transliterate', 'sanitize', 'truncate'),
+}
+DEFAULT_PRESET = next(iter(PRESETS))
+
+
+def build_pipeline(rule_names, timings=None):
+    """Returns a single function that applies the named rules in order.
+
+    rule_names: keys of RULES [iterable]
+    timings: (optional) dict to add the seconds spent in each rule to, keyed by rule
+             name.  Timing every call has a cost, so leave out unless measuring. [dict]
     """
+    funcs = [RULES[name] for name in rule_names]
+
+    if timings is not None:
+        funcs = [timed_rule(func, name, timings)
+                 for func, name in zip(funcs, rule_names)]
+
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def pipeline(text):
+        for func in funcs:
+            text = func(text)
+        return text
+
+    return pipeline
 
-    def __init__(self, label_name, label_type='normal', label_width=150):
-        super().__init__()
-
-        self.setText(label_name)
-        self.setMinimumSize(label_width, 28)
-        self.setMaximumHeight(28)
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
-
-        # Set label stylesheet based on label_type
-
-        if label_type == 'normal':
-            self.setStyleSheet("""
-                QLabel {
-                    color: rgb(154, 154, 154);
-                    font: 14px 'Discreet'}
-                QLabel:disabled {
-                    color: rgb(106, 106, 106)}""")
-        elif label_type == 'underline':
-            self.setAlignment(QtCore.Qt.AlignCenter)
-            self.setStyleSheet("""
-                QLabel {
-                    color: rgb(154, 154, 154);
-                    border-bottom: 1px inset rgb(40, 40, 40);
-                    font: 14px 'Discreet'}
-                QLabel:disabled {
-                    color: rgb(106, 106, 106)}""")
-        elif label_type == 'background':
-            self.setStyleSheet("""
-                QLabel {
-                    color: rgb(154, 154, 154);
-                    background-color: rgb(30, 30, 30);
-                    padding-left: 5px;
-                    font: 14px 'Discreet'}
-                QLabel:disabled {
-                    color: rgb(106, 106, 106)}""")
-
-
-class FlameListWidget(QtWidgets.QListWidget):
-    """Custom Qt Flame List Widget
-
-    Usage:
-        list_widget = FlameListWidget(window)
+
+def timed_rule(func, name, timings):
+    """Returns func wrapped to add the time spent in it to timings[name]."""
+    timings.setdefault(name, 0.0)
+
+    def timed(text):
+        start = time.perf_counter()
+        result = func(text)
+        timings[name] += time.perf_counter() - start
+        return result
+
+    return timed
+
+
+def time_rules(names, preset=DEFAULT_PRESET):
+    """Returns a dict of the seconds each rule of the preset spends on names."""
+    timings = {}
+    pipeline = build_pipeline(PRESETS[preset], timings)
+
+    for name in names:
+        pipeline(name)
+
+    return timings
+
+
+# Built once at import so cleaning a name is a single call.
+PIPELINES = {preset: build_pipeline(rules) for preset, rules in PRESETS.items()}
+
+
+def cleanup_text(text, preset=DEFAULT_PRESET):
+    """Returns string that is appropriate for filename usage.
+
+    Applies the rules of the preset, by default only sanitize().
+
+    Results are kept in a module level LRU cache bounded by CACHE_SIZE, so it outlives
+    each CleanupName and names seen on an earlier run are a dictionary lookup.  Hit and
+    miss counters are available from _clean_name.cache_info().
     """
+    return _clean_name(text, preset)
 
-    def __init__(self, parent_window, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        self.setMinimumSize(500, 250)
-        self.setParent(parent_window)
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.setSpacing(3)
-        self.setAlternatingRowColors(True)
-        self.setUniformItemSizes(True)
-        self.setStyleSheet("""
-            QListWidget {
-                color: #9a9a9a;
-                background-color: #2a2a2a;
-                alternate-background-color: #2d2d2d;
-                outline: none;
-                font: 14px 'Discreet'}
-            QListWidget::item:selected {
-                color: #d9d9d9;
-                background-color: #474747}""")
-
-
-class FlamePushButtonMenu(QtWidgets.QPushButton):
-    """Custom Qt Flame Menu Push Button Widget v3.1
-
-    button_name: text displayed on button [str]
-    menu_options: list of options show when button is pressed [list]
-    menu_width: (optional) width of widget. default is 150. [int]
-    max_menu_width: (optional) set maximum width of widget. default is 2000. [int]
-    menu_action: (optional) execute when button is changed. [function]
-
-    Usage:
-
-        push_button_menu_options = ['Item 1', 'Item 2', 'Item 3', 'Item 4']
-        menu_push_button = FlamePushButtonMenu(
-            'push_button_name', push_button_menu_options)
-
-        or
-
-        push_button_menu_options = ['Item 1', 'Item 2', 'Item 3', 'Item 4']
-        menu_push_button = FlamePushButtonMenu(
-            push_button_menu_options[0], push_button_menu_options)
-
-    Notes:
-        Started as v2.1
-        v3.1 adds a functionionality to set the width of the menu to be the same as the
-        button.
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _clean_name(text, preset):
+    """Cached body of cleanup_text.
+
+    Always called with both arguments by position, because lru_cache keys the same
+    call made with a default, a keyword or a position differently.
     """
+    return PIPELINES[preset](text)
+
+
+def cleanup_many(names, preset=DEFAULT_PRESET):
+    """Returns a list of cleaned up names for an iterable of names."""
+    return [_clean_name(name, preset) for name in names]
 
-    def __init__(self, button_name, menu_options, menu_width=240, max_menu_width=2000,
-                 menu_action=None):
-        super().__init__()
-
-        self.button_name = button_name
-        self.menu_options = menu_options
-        self.menu_action = menu_action
-
-        self.setText(button_name)
-        self.setMinimumHeight(28)
-        self.setMinimumWidth(menu_width)
-        self.setMaximumWidth(max_menu_width)  # is max necessary?
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.setStyleSheet("""
-            QPushButton {
-                color: rgb(154, 154, 154);
-                background-color: rgb(45, 55, 68);
-                border: none;
-                font: 14px 'Discreet';
-                padding-left: 9px;
-                text-align: left}
-            QPushButton:disabled {
-                color: rgb(116, 116, 116);
-                background-color: rgb(45, 55, 68);
-                border: none}
-            QPushButton:hover {
-                border: 1px solid rgb(90, 90, 90)}
-            QPushButton::menu-indicator {image: none}
-            QToolTip {
-                color: rgb(170, 170, 170);
-                background-color: rgb(71, 71, 71);
-                border: 10px solid rgb(71, 71, 71)}""")
-
-        # Menu
-        def match_width():
-            """Match menu width to the parent push button width."""
-            self.pushbutton_menu.setMinimumWidth(self.size().width())
-
-        self.pushbutton_menu = QtWidgets.QMenu(self)
-        self.pushbutton_menu.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.pushbutton_menu.aboutToShow.connect(match_width)
-        self.pushbutton_menu.setStyleSheet("""
-            QMenu {
-                color: rgb(154, 154, 154);
-                background-color: rgb(45, 55, 68);
-                border: none; font: 14px 'Discreet'}
-            QMenu::item:selected {
-                color: rgb(217, 217, 217);
-                background-color: rgb(58, 69, 81)}""")
-
-        self.populate_menu(menu_options)
-        self.setMenu(self.pushbutton_menu)
-
-    def create_menu(self, option, menu_action):
-        """Create menu."""
-        self.setText(option)
-
-        if menu_action:
-            menu_action()
-
-    def populate_menu(self, options):
-        """Empty the menu then reassemble the options."""
-        self.pushbutton_menu.clear()
-
-        for option in options:
-            self.pushbutton_menu.addAction(
-                option, partial(self.create_menu, option, self.menu_action))
-
-
-class FlameTextEdit(QtWidgets.QTextEdit):
-    """Custom Qt Flame Text Edit Widget v2.1
-
-    text: text to be displayed [str]
-    read_only: (optional) make text in window read only [bool] - default is False
-
-    Usage:
-        text_edit = FlameTextEdit('some_text_here', True_or_False)
+
+def rules_hash(preset):
+    """Returns a hash of the source code of the preset's rules and the settings used.
+
+    Editing a rule, its patterns or MAX_LENGTH, or a Python with different Unicode
+    data, changes the hash, so names cleaned by the old rules are never returned.
     """
+    import hashlib
+    import inspect
 
-    def __init__(self, text, read_only=False):
-        super().__init__()
-
-        self.setMinimumHeight(20)
-        self.setMinimumWidth(150)
-        self.setMaximumHeight(60)
-        self.setText(text)
-        self.setReadOnly(read_only)
-        self.setFocusPolicy(QtCore.Qt.ClickFocus)
-
-        if read_only:
-            self.setStyleSheet("""
-                QTextEdit {color: rgb(154, 154, 154);
-                           background-color:
-                           rgb(28, 28, 28);
-                           selection-color: #262626;
-                           selection-background-color: #b8b1a7;
-                           border: 1px solid rgb(55, 55, 55);
-                           padding-left: 5px;
-                           font: 14px 'Discreet'}
-                ScrollBar {color: #111111;
-                           background: rgb(49, 49, 49)}
-                ScrollBar::handle {color: #111111;
-                                   background : 111111}
-                ScrollBar::add-line:vertical {border: none;
-                                              background: none;
-                                              width: 0px;
-                                              height: 0px}
-                ScrollBar::sub-line:vertical {border: none;
-                                              background: none;
-                                              width: 0px;
-                                              height: 0px}
-                ScrollBar {color: #111111;
-                           background: rgb(49, 49, 49)}
-                ScrollBar::handle {color: #111111;
-                                   background : 111111}
-                ScrollBar::add-line:horizontal {border: none;
-                                                background: none;
-                                                width: 0px;
-                                                height: 0px}
-                ScrollBar::sub-line:horizontal {border: none;
-                                                background: none;
-                                                width: 0px;
-                                                height: 0px}""")
-        else:
-            self.setStyleSheet("""
-                QTextEdit {color: rgb(154, 154, 154);
-                                  background-color: #37414b;
-                                  selection-color: #262626;
-                                  selection-background-color: #b8b1a7;
-                                  border: none;
-                                  padding-left: 5px;
-                                  font: 14px 'Discreet'}
-                QTextEdit:focus {background-color: #495663}'
-                QScrollBar {color: #111111;
-                            background: rgb(49, 49, 49)}
-                QScrollBar::handle {color: #111111;
-                                    background : 111111;}
-                QScrollBar::add-line:vertical {border: none;
-                                               background: none;
-                                               width: 0px;
-                                               height: 0px}
-                QScrollBar::sub-line:vertical {border: none;
-                                               background: none;
-                                               width: 0px;
-                                               height: 0px}
-                QScrollBar {color: #111111;
-                            background: rgb(49, 49, 49)}
-                QScrollBar::handle {color: #111111;
-                                    background : 111111;}
-                QScrollBar::add-line:horizontal {border: none;
-                                                 background: none;
-                                                 width: 0px;
-                                                 height: 0px}'
-                QScrollBar::sub-line:horizontal {border: none;
-                                                 background: none;
-                                                 width: 0px;
-                                                 height: 0px}""")
+    digest = hashlib.sha1()
+    for name in PRESETS[preset]:
+        digest.update(inspect.getsource(RULES[name]).encode())
+
+    settings = (MAX_LENGTH, SEPARATORS.pattern, PROTECTED_TOKENS.pattern,
+                ASCII_SEPARATORS, TRANSLITERATIONS, unicodedata.unidata_version)
+    digest.update(repr(settings).encode())
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Cleaned names stored in a sqlite database, keyed by rules hash and name.
+
+    The database is only opened on first use.  Names found or cleaned are also kept in
+    memory, up to CACHE_SIZE per preset, so the database is read once per name and
+    session.  If it cannot be opened or written the cache turns itself off for the
+    rest of the session and names are cleaned as usual.
+
+    path: database file [str]
+    size: most names to keep, the ones written longest ago are removed first [int]
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.connection = None
+        self.usable = True
+        self.hashes = {}
+        self.recent = {}
+
+    def connect(self):
+        """Open the database, creating it if needed.
+
+        Keeps sqlite's default rollback journal, as WAL does not work on network
+        shares, where the user folder often is.
+        """
+        import sqlite3
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=5)
+        self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS names '
+                '(rules TEXT, name TEXT, clean TEXT, PRIMARY KEY (rules, name))')
+
+    def lookup(self, rules, names):
+        """Returns a dict of the names found in the database and their clean names."""
+        found = {}
+        for start in range(0, len(names), DISK_CACHE_BATCH):
+            batch = names[start:start + DISK_CACHE_BATCH]
+            found.update(self.connection.execute(
+                    'SELECT name, clean FROM names WHERE rules = ? AND name IN '
+                    f'({",".join("?" * len(batch))})', (rules, *batch)))
+        return found
+
+    def store(self, rules, names, names_clean):
+        """Add clean names to the database, then trim it to size."""
+        with self.connection:
+            self.connection.executemany(
+                    'INSERT OR REPLACE INTO names VALUES (?, ?, ?)',
+                    ((rules, name, name_clean)
+                     for name, name_clean in zip(names, names_clean)))
+            self.connection.execute(
+                    'DELETE FROM names '
+                    'WHERE rowid <= (SELECT max(rowid) FROM names) - ?', (self.size,))
+
+    def cleanup_many(self, names, preset):
+        """Returns a list of cleaned up names, only cleaning the ones not stored yet."""
+        import sqlite3
+
+        names = list(names)
+        try:
+            if self.connection is None:
+                self.connect()
+            if preset not in self.hashes:
+                self.hashes[preset] = rules_hash(preset)
+
+            rules = self.hashes[preset]
+            recent = self.recent.setdefault(preset, {})
+            unknown = [name for name in dict.fromkeys(names) if name not in recent]
+            found = self.lookup(rules, unknown)
+
+            missing = [name for name in unknown if name not in found]
+            if missing:
+                missing_clean = [_clean_name(name, preset) for name in missing]
+                found.update(zip(missing, missing_clean))
+                self.store(rules, missing, missing_clean)
+        except (sqlite3.Error, OSError) as error:
+            CleanupName.message(f'Disk cache turned off, {self.path}: {error}')
+            self.usable = False
+            return [_clean_name(name, preset) for name in names]
+
+        names_clean = [recent[name] if name in recent else found[name]
+                       for name in names]
+
+        if len(recent) + len(found) > CACHE_SIZE:
+            recent.clear()
+        recent.update(found)
+        return names_clean
+
+
+_disk_cache = DiskCache(DISK_CACHE_PATH, DISK_CACHE_SIZE)
+
+
+def cleanup_parallel(names, preset=DEFAULT_PRESET, workers=None,
+                     chunk_size=PARALLEL_CHUNK_SIZE):
+    """Yields cleaned up names in order, cleaning chunks of them in worker processes.
+
+    Meant for large offline batches, not for use inside Flame.  The input is read a
+    chunk at a time and only a couple of chunks per worker are in flight, so memory use
+    does not grow with the input.  If the input turns out to be shorter than
+    PARALLEL_MINIMUM, or workers is 1, it is all cleaned in this process instead.
+
+    names: names to clean up [iterable]
+    preset: (optional) key of PRESETS [str]
+    workers: (optional) number of processes. default is the number of CPUs [int]
+    chunk_size: (optional) names sent to a worker at a time [int]
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count()
+    names = iter(names)
+    head = list(islice(names, PARALLEL_MINIMUM))
+
+    if workers == 1 or len(head) < PARALLEL_MINIMUM:
+        yield from cleanup_many(head, preset)
+        yield from (_clean_name(name, preset) for name in names)
+        return
+
+    names = chain(head, names)
+    pending = deque()
+
+    with ProcessPoolExecutor(workers) as executor:
+        while chunk := list(islice(names, chunk_size)):
+            pending.append(executor.submit(cleanup_many, chunk, preset))
+            if len(pending) > workers * 2:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def find_changes(names, names_clean):
+    """Yields the index of every name that differs from its cleaned up version.
+
+    Names that clean up to nothing are left out, a clip is never renamed to ''.
+    """
+    for num, (name, name_clean) in enumerate(zip(names, names_clean)):
+        if name_clean and name != name_clean:
+            yield num
+
+
+def find_collisions(names_clean):
+    """Returns a dict of every clean name shared by more than one clip.
+
+    Keys are the clean names and values are lists of the indexes that share it, built
+    in a single pass over the names.  Names that clean up to nothing are not renamed,
+    so they do not collide.
+    """
+    index = {}
+    for num, name in enumerate(names_clean):
+        index.setdefault(name, []).append(num)
+
+    return {name: nums for name, nums in index.items() if len(nums) > 1 and name}
+
+
+def add_suffixes(names, names_clean, collisions, suffix, start):
+    """Returns a copy of names_clean with a numbered suffix added to duplicates.
+
+    In each group of collisions, the first clip that already has the clean name keeps
+    it, otherwise the first clip does.  The others get suffix formatted with a number
+    counting up from start, skipping any result that is already in use.  Numbers are
+    assigned in selection order so the result is the same every time.
+
+    names: original names [list]
+    names_clean: cleaned up names of the above [list]
+    collisions: output of find_collisions for names_clean [dict]
+    suffix: format string for the number, like '_v{}' [str]
+    start: first number to try [int]
+    """
+    result = list(names_clean)
+    taken = set(names_clean)
+
+    for name, nums in collisions.items():
+        keeper = next((num for num in nums if names[num] == name), nums[0])
+        count = start
+
+        for num in nums:
+            if num == keeper:
+                continue
+
+            while (candidate := name + suffix.format(count)) in taken:
+                count += 1
+
+            taken.add(candidate)
+            result[num] = candidate
+            count += 1
+
+    return result
+
+
+def container_types():
+    """Returns the tuple of container classes available in this version of Flame."""
+    return tuple(getattr(flame, name) for name in CONTAINER_TYPES
+                 if hasattr(flame, name))
+
+
+def container_contents(container):
+    """Yields what is inside of a container, reading one attribute at a time."""
+    for name in CONTAINER_ATTRIBUTES:
+        yield from getattr(container, name, ())
+
+
+def sequence_types():
+    """Returns a tuple of the sequence class, or an empty one if Flame has none."""
+    return (flame.PySequence,) if hasattr(flame, 'PySequence') else ()
+
+
+def sequence_segments(sequence):
+    """Yields the segments on every track of every version of a sequence."""
+    for version in getattr(sequence, 'versions', ()):
+        for track in getattr(version, 'tracks', ()):
+            yield from getattr(track, 'segments', ())
+
+
+def expand_selection(selection):
+    """Yields the clips and segments of selection, looking inside any containers.
+
+    Each sequence is yielded followed by the segments on its tracks.  Lazy and depth
+    first, so the first names can be read while the rest of a library is still
+    unexplored.  Each object is only yielded once, even if it was selected and also
+    inside of a selected container.  Flame makes a new Python object for a clip every
+    time it is read, so objects are told apart by their uid, or by their id() if they
+    have no uid.  Reading the uid costs a call to Flame, so a selection with nothing to
+    search inside of is yielded as it is.  Empty entries of None are skipped.
+    """
+    containers = container_types()
+    sequences = sequence_types()
+
+    if not any(issubclass(item_type, containers + sequences)
+               for item_type in set(map(type, selection))):
+        yield from (item for item in selection if item is not None)
+        return
+
+    seen = {}  # Holds on to the objects so their ids are not reused.
+    stack = [iter(selection)]
+    done = object()
+
+    while stack:
+        item = next(stack[-1], done)
+
+        if item is done:
+            stack.pop()
+            continue
+        if item is None:
+            continue
+
+        uid = clip_uid(item)
+        key = id(item) if uid is None else uid
+        if key not in seen:
+            seen[key] = item
+
+            if isinstance(item, containers):
+                stack.append(container_contents(item))
+            else:
+                yield item
+                if isinstance(item, sequences):
+                    stack.append(sequence_segments(item))
+
+
+def rename_clips(renames, chunk_size=CHUNK_SIZE):
+    """Rename clips a chunk at a time.
+
+    renames: iterable of (clip, old name, new name) tuples
+
+    Yields the list of renames done in each chunk, so the caller can report progress
+    or stop early between chunks.  If a rename fails, as it does for a deleted clip,
+    the renames done so far in the chunk are yielded before the error is raised.
+    """
+    chunk = []
+    try:
+        for rename in renames:
+            rename[0].name.set_value(rename[2])
+            chunk.append(rename)
+
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    except Exception:
+        if chunk:
+            yield chunk
+        raise
+
+    if chunk:
+        yield chunk
+
+
+def open_journal():
+    """Returns the journal file opened for appending, or None if it cannot be."""
+    try:
+        os.makedirs(USER_DIR, exist_ok=True)
+        if (os.path.exists(JOURNAL_PATH)
+                and os.path.getsize(JOURNAL_PATH) >= JOURNAL_SIZE):
+            rotate_journal()
+        return open(JOURNAL_PATH, 'a', encoding='utf-8', buffering=JOURNAL_BUFFER)
+    except OSError:
+        return None
+
+
+def rotate_journal():
+    """Move the journal file to .1, the old .1 to .2 and so on up to JOURNAL_COUNT."""
+    for num in range(JOURNAL_COUNT - 1, 0, -1):
+        path = f'{JOURNAL_PATH}.{num}'
+        if os.path.exists(path):
+            os.replace(path, f'{JOURNAL_PATH}.{num + 1}')
+    os.replace(JOURNAL_PATH, f'{JOURNAL_PATH}.1')
+
+
+def journal_lines(run_id, action, start, renames):
+    """Yields a line of the journal file for each (clip, old name, new name) rename.
+
+    Formatted directly with the C string encoder from json, rather than calling
+    json.dumps for every line.
+    """
+    from json.encoder import encode_basestring as quote
+
+    prefix = f'[{quote(run_id)},{quote(action)},'
+    for num, (clip, old_name, new_name) in enumerate(renames, start):
+        uid = clip_uid(clip)
+        uid = quote(str(uid)) if uid else 'null'
+        yield f'{prefix}{num},{uid},{quote(old_name)},{quote(new_name)}]\n'
+
+
+# Style for the whole window, applied once to the top level widget instead of to each
+# widget.  Variations are selected by the buttonColor and labelType properties.
+STYLESHEET = """
+    QWidget {
+        background-color: #272727}
+    QToolTip {
+        color: rgb(170, 170, 170);
+        background-color: rgb(71, 71, 71);
+        border: 10px solid rgb(71, 71, 71)}
+    FlameButton {
+        color: rgb(154, 154, 154);
+        background-color: rgb(58, 58, 58);
+        border: none;
+        font: 14px 'Discreet'}
+    FlameButton:hover {
+        border: 1px solid rgb(90, 90, 90)}
+    FlameButton:pressed {
+        color: rgb(159, 159, 159);
+        background-color: rgb(66, 66, 66);
+        border: 1px solid rgb(90, 90, 90)}
+    FlameButton[buttonColor="blue"] {
+        color: rgb(190, 190, 190);
+        background-color: rgb(0, 110, 175);
+        font: 12px 'Discreet'}
+    FlameButton[buttonColor="blue"]:pressed {
+        color: rgb(159, 159, 159);
+        background-color: rgb(0, 110, 175)}
+    FlameButton:disabled, FlameButton[buttonColor="blue"]:disabled {
+        color: rgb(116, 116, 116);
+        background-color: rgb(58, 58, 58);
+        border: none}
+    FlameLabel {
+        color: rgb(154, 154, 154);
+        font: 14px 'Discreet'}
+    FlameLabel[labelType="underline"] {
+        border-bottom: 1px inset rgb(40, 40, 40)}
+    FlameLabel[labelType="background"] {
+        background-color: rgb(30, 30, 30);
+        padding-left: 5px}
+    FlameLabel:disabled {
+        color: rgb(106, 106, 106)}
+    FlameLineEdit {
+        color: rgb(154, 154, 154);
+        background-color: rgb(55, 65, 75);
+        selection-color: rgb(38, 38, 38);
+        selection-background-color: rgb(184, 177, 167);
+        border: 1px solid rgb(55, 65, 75);
+        padding-left: 5px;
+        font: 14px 'Discreet'}
+    FlameLineEdit:focus {
+        background-color: rgb(73, 86, 99)}
+    FlameLineEdit:hover {
+        border: 1px solid rgb(90, 90, 90)}
+    FlameLineEdit:disabled {
+        color: rgb(106, 106, 106);
+        background-color: rgb(55, 55, 55);
+        border: 1px solid rgb(55, 55, 55)}
+    FlameListView {
+        color: #9a9a9a;
+        background-color: #2a2a2a;
+        alternate-background-color: #2d2d2d;
+        outline: none;
+        border: none;
+        font: 14px 'Discreet'}
+    FlameListView::item {
+        padding-left: 3px}
+    FlameListView::item:selected {
+        color: #d9d9d9;
+        background-color: #474747}
+    FlamePushButtonMenu {
+        color: rgb(154, 154, 154);
+        background-color: rgb(45, 55, 68);
+        border: none;
+        font: 14px 'Discreet';
+        padding-left: 9px;
+        text-align: left}
+    FlamePushButtonMenu:disabled {
+        color: rgb(116, 116, 116);
+        background-color: rgb(45, 55, 68);
+        border: none}
+    FlamePushButtonMenu:hover {
+        border: 1px solid rgb(90, 90, 90)}
+    FlamePushButtonMenu::menu-indicator {
+        image: none}
+    QMenu {
+        color: rgb(154, 154, 154);
+        background-color: rgb(45, 55, 68);
+        border: none;
+        font: 14px 'Discreet'}
+    QMenu::item:selected {
+        color: rgb(217, 217, 217);
+        background-color: rgb(58, 69, 81)}
+    FlameTextEdit {
+        color: rgb(154, 154, 154);
+        background-color: #37414b;
+        selection-color: #262626;
+        selection-background-color: #b8b1a7;
+        border: none;
+        padding-left: 5px;
+        font: 14px 'Discreet'}
+    FlameTextEdit:focus {
+        background-color: #495663}
+    FlameTextEdit[readOnly="true"] {
+        background-color: rgb(28, 28, 28);
+        border: 1px solid rgb(55, 55, 55)}
+    FlameTextEdit QScrollBar {
+        color: #111111;
+        background: rgb(49, 49, 49)}
+    FlameTextEdit QScrollBar::handle {
+        color: #111111;
+        background: #111111}
+    FlameTextEdit QScrollBar::add-line, FlameTextEdit QScrollBar::sub-line {
+        border: none;
+        background: none;
+        width: 0px;
+        height: 0px}"""
+
+
+class RunStats:
+    """Seconds spent in each phase and counts of one run of the tool.
+
+    Only created when STATS is set.  Phases are timed per chunk of clips, never per
+    name, and without stats the timers are a shared nullcontext.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.start_cache = _clean_name.cache_info()
+        self.seconds = {}
+        self.counts = {}
+
+    @contextmanager
+    def timer(self, phase):
+        """Add the time spent in the with block to phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+
+    def count(self, name, num):
+        """Add num to the named counter."""
+        self.counts[name] = self.counts.get(name, 0) + num
+
+    def summary(self, outcome):
+        """Returns the stats as a line of JSON."""
+        import json
+
+        cache = _clean_name.cache_info()
+        self.count('cache_hits', cache.hits - self.start_cache.hits)
+        self.count('cache_misses', cache.misses - self.start_cache.misses)
+        self.seconds['total'] = time.perf_counter() - self.start
+
+        return json.dumps({
+                'version': VERSION,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'outcome': outcome,
+                **self.counts,
+                'seconds': {phase: round(seconds, 6)
+                            for phase, seconds in self.seconds.items()}})
+
+
+def write_stats_log(line):
+    """Append a line to STATS_LOG through a rotating log handler set up on first use."""
+    import logging
+    from logging.handlers import RotatingFileHandler
+
+    logger = logging.getLogger(__name__ + '.stats')
+    if not logger.handlers:
+        handler = RotatingFileHandler(STATS_LOG, maxBytes=STATS_LOG_SIZE,
+                                      backupCount=STATS_LOG_COUNT, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    logger.info(line)
+
+
+# Timer used in place of RunStats.timer when no stats are kept.
+NO_TIMER = nullcontext()
+
+
+def clip_uid(clip):
+    """Returns the unique id Flame has for the clip, or None if there is not one."""
+    uid = getattr(clip, 'uid', None)
+    if hasattr(uid, 'get_value'):
+        uid = uid.get_value()
+    return uid or None
+
+
+def plan_lines(entries):
+    """Yields a line of a rename plan for each (uid, old name, new name) entry."""
+    from json.encoder import encode_basestring as quote
+
+    for uid, old_name, new_name in entries:
+        uid = 'null' if uid is None else quote(uid)
+        changed = 'true' if old_name != new_name else 'false'
+        yield f'[{uid},{quote(old_name)},{quote(new_name)},{changed}]\n'
+
+
+def read_plan(path):
+    """Returns a rename plan file as a dict of (uid, old name): deque of new names.
+
+    Clips without uids that share an old name, like duplicates given suffixes, get one
+    new name each, in the order of the plan.  Unchanged entries are kept as well so
+    that order still lines up with the clips.
+
+    Read and decoded a chunk of lines at a time, with one json.loads per chunk.
+    """
+    import json
+
+    plan = {}
+    with open(path, encoding='utf-8') as file:
+        lines = (line for line in file if not line.isspace())
+        while chunk := list(islice(lines, CHUNK_SIZE)):
+            for uid, old_name, new_name, _ in json.loads(f'[{",".join(chunk)}]'):
+                plan.setdefault((uid, old_name), deque()).append(new_name)
+    return plan
+
+
+def count_plan_changes(plan):
+    """Returns the number of entries in a plan from read_plan that change a name."""
+    return sum(bool(new_name) and new_name != old_name
+               for (_, old_name), new_names in plan.items() for new_name in new_names)
+
+
+def plan_renames(selection, plan):
+    """Yields a (clip, old name, new name) rename for each clip of selection in plan.
+
+    Clips are matched by uid and current name, or by current name alone if the plan
+    has no uids.  Each match takes the next new name listed for it, so clips with the
+    same name are given their new names in selection order, as when the plan was
+    made.  A clip renamed since the plan was made is left alone, as is one planned to
+    be renamed to ''.
+    """
+    uids = any(uid is not None for uid, _ in plan)
+
+    for clip in expand_selection(selection):
+        name = clip.name.get_value()
+        new_names = plan.get((clip_uid(clip) if uids else None, name))
+        if new_names:
+            new_name = new_names.popleft()
+            if new_name and new_name != name:
+                yield clip, name, new_name
+
+
+def load_ui():
+    """Import PySide6 and define the Flame widget classes.
+
+    Deferred until the tool is run so that the sanitizer can be imported and used
+    without Qt.  Only does the work once, subsequent calls return immediately.
+    """
+    global QtCore, QtGui, QtWidgets  # pylint: disable=global-statement
+    global FlameButton, FlameLabel, FlameLineEdit  # pylint: disable=global-statement
+    global FlameListView, FlamePushButtonMenu  # pylint: disable=global-statement
+    global FlameTextEdit, NamesModel  # pylint: disable=global-statement
+
+    if QtWidgets is not None:
+        return
+
+    from PySide6 import QtCore, QtGui, QtWidgets
+
+    class FlameButton(QtWidgets.QPushButton):
+        """Custom Qt Flame Button Widget v2.1
+
+        button_name: button text [str]
+        connect: execute when clicked [function]
+        button_color: (optional) normal, blue [str]
+        button_width: (optional) default is 150 [int]
+        button_max_width: (optional) default is 150 [int]
+
+        Usage:
+
+            button = FlameButton(
+                'Button Name', do_something__when_pressed, button_color='blue')
+        """
+
+        def __init__(self, button_name, connect, button_color='normal',
+                     button_width=150, button_max_width=150):
+            super().__init__()
+
+            self.setText(button_name)
+            self.setMinimumSize(QtCore.QSize(button_width, 28))
+            self.setMaximumSize(QtCore.QSize(button_max_width, 28))
+            self.setFocusPolicy(QtCore.Qt.NoFocus)
+            self.clicked.connect(connect)
+            self.setProperty('buttonColor', button_color)
+
+    class FlameLabel(QtWidgets.QLabel):
+        """Custom Qt Flame Label Widget v2.1
+
+        label_name:  text displayed [str]
+        label_type:  (optional) select from different styles:
+                     normal, underline, background. default is normal [str]
+        label_width: (optional) default is 150 [int]
+
+        Usage:
+
+            label = FlameLabel('Label Name', 'normal', 300)
+        """
+
+        def __init__(self, label_name, label_type='normal', label_width=150):
+            super().__init__()
+
+            self.setText(label_name)
+            self.setMinimumSize(label_width, 28)
+            self.setMaximumHeight(28)
+            self.setFocusPolicy(QtCore.Qt.NoFocus)
+
+            self.setProperty('labelType', label_type)
+            if label_type == 'underline':
+                self.setAlignment(QtCore.Qt.AlignCenter)
+
+    class FlameLineEdit(QtWidgets.QLineEdit):
+        """Custom Qt Flame Line Edit Widget v2.1
+
+        Main window should include this: window.setFocusPolicy(QtCore.Qt.StrongFocus)
+
+        text: text show [str]
+        width: (optional) width of widget. default is 150. [int]
+        max_width: (optional) maximum width of widget. default is 2000. [int]
+
+        Usage:
+
+            line_edit = FlameLineEdit('Some text here')
+        """
+
+        def __init__(self, text, width=150, max_width=2000):
+            super().__init__()
+
+            self.setText(text)
+            self.setMinimumHeight(28)
+            self.setMinimumWidth(width)
+            self.setMaximumWidth(max_width)
+
+    class FlameListView(QtWidgets.QTableView):
+        """Custom Qt Flame List View
+
+        A table view set up to look like a list, with one column per list of names
+        in the model.  Only the visible rows are drawn and, unlike QListView and
+        QTreeView, nothing is done per row when the model changes or resets.
+
+        Usage:
+            list_view = FlameListView(window)
+            list_view.setModel(model)
+        """
+
+        def __init__(self, parent_window, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+
+            self.setMinimumSize(500, 250)
+            self.setParent(parent_window)
+            self.setFocusPolicy(QtCore.Qt.NoFocus)
+            self.setAlternatingRowColors(True)
+            self.setShowGrid(False)
+            self.setWordWrap(False)
+            self.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+            self.horizontalHeader().hide()
+            self.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+            self.verticalHeader().hide()
+            self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+            self.verticalHeader().setDefaultSectionSize(26)
+
+    class NamesModel(QtCore.QAbstractTableModel):
+        """Table model that shows one of several views of parallel lists of names.
+
+        The lists are referenced, not copied.  Switching between views of the same
+        shape only tells the view to repaint, so the cost does not grow with the
+        number of names.
+
+        views: list of (columns, rows) tuples.  columns is a list of the name lists
+               to show side by side.  rows is a list of the indexes to show, or None
+               to show every name. [list]
+
+        Indexes added to the highlight set are drawn in highlight_color.  A filter,
+        set with set_filter, further limits every view to the indexes in it.
+
+        Usage:
+            model = NamesModel([([names_clean], None), ([names, names_clean], rows)])
+            model.set_view(1)
+        """
+
+        def __init__(self, views, parent=None):
+            super().__init__(parent)
+
+            self.views = views
+            self.view = 0
+            self.filter = None
+            self.rows = self.view_rows()
+            self.row_count = self.count_rows()
+            self.highlight = set()
+            self.highlight_color = QtGui.QColor(220, 150, 60)
+
+        def view_rows(self):
+            """Indexes shown by the current view and filter, or None for every name."""
+            rows = self.views[self.view][1]
+            if self.filter is None:
+                return rows
+            if rows is None:
+                return self.filter
+            matches = set(self.filter)
+            return [num for num in rows if num in matches]
+
+        def count_rows(self):
+            """Number of rows the current view has in the name lists right now."""
+            if self.rows is None:
+                return len(self.views[self.view][0][0])
+            return len(self.rows)
+
+        def name_index(self, row):
+            """Index in the name lists of a row of the current view."""
+            return row if self.rows is None else self.rows[row]
+
+        def rowCount(self, parent=QtCore.QModelIndex()):  # pylint: disable=invalid-name
+            """Number of rows in the current view."""
+            if parent.isValid():
+                return 0
+            return self.row_count
+
+        # pylint: disable-next=invalid-name
+        def columnCount(self, parent=QtCore.QModelIndex()):
+            """Number of name lists shown side by side in the current view."""
+            if parent.isValid():
+                return 0
+            return len(self.views[self.view][0])
+
+        def data(self, index, role=QtCore.Qt.DisplayRole):
+            """Name to display for the row and column."""
+            if role == QtCore.Qt.DisplayRole:
+                columns = self.views[self.view][0]
+                return columns[index.column()][self.name_index(index.row())]
+            if role == QtCore.Qt.ForegroundRole and self.highlight:
+                if self.name_index(index.row()) in self.highlight:
+                    return self.highlight_color
+            return None
+
+        def set_views(self, views):
+            """Show new name lists, starting again from the first view."""
+            self.beginResetModel()
+            self.views = views
+            self.view = 0
+            self.filter = None
+            self.highlight.clear()
+            self.rows = self.view_rows()
+            self.row_count = self.count_rows()
+            self.endResetModel()
+
+        def set_filter(self, rows):
+            """Only show the indexes in rows, a sorted list, or every index if None."""
+            self.beginResetModel()
+            self.filter = rows
+            self.rows = self.view_rows()
+            self.row_count = self.count_rows()
+            self.endResetModel()
+
+        def refresh(self):
+            """Redraw the view after the name lists have been changed in place."""
+            self.beginResetModel()
+            self.rows = self.view_rows()
+            self.row_count = self.count_rows()
+            self.endResetModel()
+
+        def add_rows(self):
+            """Show the rows that have been appended to the name lists."""
+            count = self.count_rows()
+            if count > self.row_count:
+                self.beginInsertRows(QtCore.QModelIndex(), self.row_count, count - 1)
+                self.row_count = count
+                self.endInsertRows()
+
+        def set_view(self, view):
+            """Show a different view of the names."""
+            if view == self.view:
+                return
+
+            columns = self.views[self.view][0]
+            rows = self.rows
+            self.view = view
+
+            if len(columns) != len(self.views[view][0]) or self.view_rows() is not rows:
+                self.refresh()
+                return
+
+            if self.rowCount():
+                self.dataChanged.emit(
+                    self.index(0, 0),
+                    self.index(self.rowCount() - 1, self.columnCount() - 1),
+                    [QtCore.Qt.DisplayRole])
+
+    class FlamePushButtonMenu(QtWidgets.QPushButton):
+        """Custom Qt Flame Menu Push Button Widget v3.1
+
+        button_name: text displayed on button [str]
+        menu_options: list of options show when button is pressed [list]
+        menu_width: (optional) width of widget. default is 150. [int]
+        max_menu_width: (optional) set maximum width of widget. default is 2000. [int]
+        menu_action: (optional) execute when button is changed. [function]
+
+        Usage:
+
+            push_button_menu_options = ['Item 1', 'Item 2', 'Item 3', 'Item 4']
+            menu_push_button = FlamePushButtonMenu(
+                'push_button_name', push_button_menu_options)
+
+            or
+
+            push_button_menu_options = ['Item 1', 'Item 2', 'Item 3', 'Item 4']
+            menu_push_button = FlamePushButtonMenu(
+                push_button_menu_options[0], push_button_menu_options)
+
+        Notes:
+            Started as v2.1
+            v3.1 adds a functionionality to set the width of the menu to be the same as
+            the button.
+        """
+
+        def __init__(self, button_name, menu_options, menu_width=240,
+                     max_menu_width=2000, menu_action=None):
+            super().__init__()
+
+            self.button_name = button_name
+            self.menu_options = menu_options
+            self.menu_action = menu_action
+
+            self.setText(button_name)
+            self.setMinimumHeight(28)
+            self.setMinimumWidth(menu_width)
+            self.setMaximumWidth(max_menu_width)  # is max necessary?
+            self.setFocusPolicy(QtCore.Qt.NoFocus)
+
+            # Menu
+            def match_width():
+                """Match menu width to the parent push button width."""
+                self.pushbutton_menu.setMinimumWidth(self.size().width())
+
+            self.pushbutton_menu = QtWidgets.QMenu(self)
+            self.pushbutton_menu.setFocusPolicy(QtCore.Qt.NoFocus)
+            self.pushbutton_menu.aboutToShow.connect(match_width)
+
+            self.populate_menu(menu_options)
+            self.setMenu(self.pushbutton_menu)
+
+        def create_menu(self, option, menu_action):
+            """Create menu."""
+            self.setText(option)
+
+            if menu_action:
+                menu_action()
+
+        def populate_menu(self, options):
+            """Empty the menu then reassemble the options."""
+            self.pushbutton_menu.clear()
+
+            for option in options:
+                self.pushbutton_menu.addAction(
+                    option, partial(self.create_menu, option, self.menu_action))
+
+    class FlameTextEdit(QtWidgets.QTextEdit):
+        """Custom Qt Flame Text Edit Widget v2.1
+
+        text: text to be displayed [str]
+        read_only: (optional) make text in window read only [bool] - default is False
+
+        Usage:
+            text_edit = FlameTextEdit('some_text_here', True_or_False)
+        """
+
+        def __init__(self, text, read_only=False):
+            super().__init__()
+
+            self.setMinimumHeight(20)
+            self.setMinimumWidth(150)
+            self.setMaximumHeight(60)
+            self.setText(text)
+            self.setReadOnly(read_only)
+            self.setFocusPolicy(QtCore.Qt.ClickFocus)
 
 
 class CleanupName:
@@ -379,27 +1267,108 @@ class CleanupName:
     Will remove all symbols and change whitespace to underscores.
     """
 
+    # The window is built once per Flame session and shared by every instance, the
+    # instance currently shown in it is active.
+    window = None
+    active = None
+
+    description = ('Clean up clip names by removing all symbols and replacing '
+                   'whitespace with underscores.')
+    views = ['Clean Name', 'Original Name', 'Changes']
+
     def __init__(self, selection):
         """Initialize object."""
+        self.start_time = time.perf_counter()
+        self.stats = RunStats() if STATS else None
+        load_ui()
+
         self.selection = selection
-        self.names = [clip.name.get_value() for clip in self.selection]
-        self.names_clean = [self.cleanup_text(name) for name in self.names]
+        self.selection_iter = expand_selection(selection)
+
+        # Unknown until the end if any containers or sequences have to be searched.
+        item_types = set(map(type, selection))
+        containers = container_types() + sequence_types()
+        searched = any(issubclass(item_type, containers) for item_type in item_types)
+        self.total = None if searched else len(selection)
+        self.read_count = 0
+
+        # Segments named the same as an earlier segment share its row, so each name is
+        # only cleaned and listed once.  Row of the first segment with each name, and
+        # the later segments grouped under each row.
+        self.segment_mode = searched or any(issubclass(item_type, flame.PySegment)
+                                            for item_type in item_types)
+        self.segment_rows = {}
+        self.segment_groups = {}
+
+        self.clips = []
+        self.names = []
+        self.names_sanitized = []
+        self.names_clean = []
+        self.changes = []
+        self.collisions = {}
+        self.excluded = set()
+
+        # Lowercase original and clean names searched by the filter.
+        self.search_index = []
+        self.filter_text = ''
+        self.filter_rows = None
 
-        self.description = ('Clean up clip names by removing all symbols and replacing '
-                            'whitespace with underscores.')
-        self.views = ['Clean Name', 'Original Name']
         self.view_selection = self.views[0]
+        self.duplicate_policies = list(DUPLICATE_POLICIES)
+        self.duplicate_selection = self.duplicate_policies[0]
+        self.preset = DEFAULT_PRESET
 
         self.message(VERSION_TITLE)
         self.message(f'Script called from {__file__}')
 
         self.main_window()
+        self.loader.start(0)
 
     @staticmethod
     def message(string):
         """Print message to shell window and append global MESSAGE_PREFIX."""
         print(' '.join([MESSAGE_PREFIX, string]))
 
+    def timer(self, phase):
+        """Context that adds the time spent in it to phase of the run stats, if kept."""
+        return self.stats.timer(phase) if self.stats else NO_TIMER
+
+    def message_stats(self, outcome):
+        """Print the run stats as a line of JSON and append it to STATS_LOG, if kept."""
+        if not self.stats:
+            return
+
+        changed = self.count_clips(self.changes)
+        self.stats.count('clips', self.read_count)
+        self.stats.count('changed', changed)
+        self.stats.count('skipped', self.read_count - changed)
+        self.stats.count('excluded', self.count_clips(self.excluded))
+        self.stats.count('duplicates', sum(map(len, self.collisions.values())))
+
+        line = self.stats.summary(outcome)
+        self.message(line)
+
+        if STATS_LOG:
+            try:
+                write_stats_log(line)
+            except OSError as error:
+                self.message(f'Unable to write to {STATS_LOG}: {error}')
+
+        self.stats = None
+
+    def message_cache_info(self):
+        """Print the hit and miss counts of the name cleanup cache."""
+        info = _clean_name.cache_info()
+        self.message(f'Name cache: {info.hits} hits, {info.misses} misses, '
+                     f'{info.currsize} of {info.maxsize} names stored.')
+
+    @staticmethod
+    def cleanup_many(names, preset):
+        """Returns the cleaned up names, through the disk cache if DISK_CACHE is set."""
+        if DISK_CACHE and _disk_cache.usable:
+            return _disk_cache.cleanup_many(names, preset)
+        return cleanup_many(names, preset)
+
     @staticmethod
     def refresh():
         """Refresh the flame UI.
@@ -413,144 +1382,728 @@ class CleanupName:
     @staticmethod
     def cleanup_text(text):
         """Returns string that is appropriate for filename usage."""
-        import re
+        return _clean_name(text, DEFAULT_PRESET)
 
-        # Delete first and last character if a symbol or space.
-        chopped = re.sub(r'^[\W_]+|[\W_]+$', '', text)
-        # Convert symbols & whitespace to underscores.
-        sanitized = re.sub(r'\W+', '_', chopped)
-        # Remove duplicate underscores.
-        tidy = re.sub(r'(_)\1+', '_', sanitized)
+    def load_names(self):
+        """Read and clean up clip names for LOAD_TIME, then update the window.
 
-        return tidy
+        Runs from a timer so the window is drawn before any names are read from Flame
+        and stays responsive while they are.  Every clip name is a call into Flame, so
+        on large selections this is the slow part.
+        """
+        if not self.window.isVisible():
+            self.loader.stop()
+            self.message_stats('closed')
+            return
+
+        if not self.clips:
+            self.message(f'Window shown in {self.elapsed()}.')
+
+        stop_time = time.perf_counter() + LOAD_TIME
+
+        while time.perf_counter() < stop_time:
+            clips = list(islice(self.selection_iter, CHUNK_SIZE))
+
+            if not clips:
+                self.loader.stop()
+                self.loaded()
+                return
+
+            offset = len(self.names)
+            self.read_count += len(clips)
+            with self.timer('fetch'):
+                names = [clip.name.get_value() for clip in clips]
+            if self.segment_mode:
+                clips, names = self.group_segments(clips, names)
+            with self.timer('sanitize'):
+                names_clean = self.cleanup_many(names, self.preset)
+
+            self.clips.extend(clips)
+            self.names.extend(names)
+            self.names_sanitized.extend(names_clean)
+            self.names_clean.extend(names_clean)
+            self.changes.extend(
+                    offset + num for num in find_changes(names, names_clean))
+
+        with self.timer('view'):
+            self.list_model.add_rows()
+            if self.total is None:
+                self.count_label.setText(f'Loading {self.read_count} names...')
+            else:
+                self.count_label.setText(f'Loading {self.read_count} of '
+                                         f'{self.total} names...')
+
+    def group_segments(self, clips, names):
+        """Move segments named the same as an earlier segment into that one's group.
+
+        Returns the clips and names left to be given rows of their own.  Clips are
+        never grouped, two clips with the same name are still duplicates.
+        """
+        segment_type = flame.PySegment
+        offset = len(self.names)
+        rows_clips = []
+        rows_names = []
+
+        for clip, name in zip(clips, names):
+            if isinstance(clip, segment_type):
+                row = self.segment_rows.get(name)
+                if row is not None:
+                    self.segment_groups.setdefault(row, []).append(clip)
+                    continue
+                self.segment_rows[name] = offset + len(rows_clips)
+
+            rows_clips.append(clip)
+            rows_names.append(name)
+
+        return rows_clips, rows_names
+
+    def row_clips(self, num):
+        """Yields the clip or segment of a row, then any segments grouped under it."""
+        yield self.clips[num]
+        yield from self.segment_groups.get(num, ())
+
+    def count_clips(self, rows):
+        """Number of clips in rows, counting the segments grouped under them."""
+        return len(rows) + sum(len(self.segment_groups.get(num, ())) for num in rows)
+
+    def loaded(self):
+        """Finish up once every clip name has been read."""
+        self.update_collisions()
+        self.update_search_index()
+        with self.timer('view'):
+            self.list_model.refresh()
+
+        self.update_count()
+        self.preset_btn.setEnabled(True)
+        self.duplicate_btn.setEnabled(True)
+        self.filter_edit.setEnabled(True)
+        self.exclude_btn.setEnabled(True)
+        self.export_btn.setEnabled(True)
+        self.ok_btn.setEnabled(True)
+
+        self.message(f'Loaded {self.read_count} names in {self.elapsed()}.')
+        self.message_cache_info()
+
+        if self.segment_mode and self.stats:
+            self.stats.count('grouped_segments',
+                             sum(map(len, self.segment_groups.values())))
+
+        if TIME_RULES:
+            self.message_rule_times()
+
+    def message_rule_times(self):
+        """Print the time each rule of the current preset takes on the names."""
+        for rule, seconds in time_rules(self.names, self.preset).items():
+            self.message(f'Rule {rule} took {seconds:.3f} seconds for '
+                         f'{len(self.names)} names.')
+
+    def elapsed(self):
+        """Time since the script was called, formatted for messages."""
+        return f'{time.perf_counter() - self.start_time:.3f} seconds'
 
     def update_view(self):
-        """Clear the list view and replace with the appropriate list."""
-        self.list_scroll.clear()
+        """Switch the list view to the names for the selected view."""
+        self.list_model.set_view(self.views.index(self.view_btn.text()))
+
+    def update_preset(self):
+        """Clean up the names again using the selected preset."""
+        self.preset = self.preset_btn.text()
+        with self.timer('sanitize'):
+            self.names_sanitized[:] = self.cleanup_many(self.names, self.preset)
+
+        self.update_collisions()
+        self.update_duplicates()
+
+        if TIME_RULES:
+            self.message_rule_times()
 
-        if self.view_btn.text() == 'Clean Name':
-            self.list_scroll.addItems(self.names_clean)
-        if self.view_btn.text() == 'Original Name':
-            self.list_scroll.addItems(self.names)
+    def update_collisions(self):
+        """Find the clean names shared by more than one clip and highlight them.
+
+        Excluded clips keep their original names, so they only collide with a clean
+        name they already have.
+        """
+        names_kept = list(self.names_sanitized)
+        for num in self.excluded:
+            names_kept[num] = self.names[num]
+
+        self.collisions.clear()
+        self.collisions.update(find_collisions(names_kept))
+
+        self.list_model.highlight.clear()
+        self.list_model.highlight.update(
+                num for nums in self.collisions.values() for num in nums)
+
+    def update_duplicates(self):
+        """Apply the selected duplicate policy to the clean names.
+
+        The lists are updated in place because the list model holds on to them.
+        Excluded clips keep their original names.
+        """
+        policy = DUPLICATE_POLICIES[self.duplicate_btn.text()]
+
+        if policy:
+            self.names_clean[:] = add_suffixes(
+                    self.names, self.names_sanitized, self.collisions, *policy)
+        else:
+            self.names_clean[:] = self.names_sanitized
+        for num in self.excluded:
+            self.names_clean[num] = self.names[num]
+        self.changes[:] = find_changes(self.names, self.names_clean)
+
+        self.update_search_index()
+        self.filter_rows = None
+        self.update_filter()
+        self.update_count()
+
+    def update_search_index(self):
+        """Build the lowercase names searched by the filter, once per change of names.
+
+        Takes longer than a search, so it is not left until the first key press.
+        """
+        self.search_index = [f'{name}\n{name_clean}'.lower()
+                             for name, name_clean in zip(self.names, self.names_clean)]
+
+    def update_filter(self):
+        """Only show the names that contain the filter text, ignoring case.
+
+        Runs FILTER_DELAY after the last key press.  Searches the prebuilt search
+        index, and only the rows already shown while more is typed.
+        """
+        text = self.filter_edit.text().lower()
+
+        if not text:
+            rows = None
+        else:
+            index = self.search_index
+            if self.filter_rows is not None and self.filter_text in text:
+                candidates = self.filter_rows
+            else:
+                candidates = range(len(index))
+            rows = [num for num in candidates if text in index[num]]
+
+        self.filter_text = text
+        self.filter_rows = rows
+        self.list_model.set_filter(rows)
+
+    def exclude_selected(self):
+        """Keep the original names of the selected clips."""
+        rows = self.list_scroll.selectionModel().selectedRows()
+        if not rows:
+            return
+
+        self.excluded.update(self.list_model.name_index(row.row()) for row in rows)
+        self.update_collisions()
+        self.update_duplicates()
+
+    def update_count(self):
+        """Show the number of changed, unchanged and duplicate names."""
+        duplicates = sum(len(nums) for nums in self.collisions.values())
+        changed = self.count_clips(self.changes)
+        self.count_label.setText(
+                f'{changed} changed, '
+                f'{self.read_count - changed} unchanged, '
+                f'{duplicates} duplicates')
+
+    def export_plan(self):
+        """Write the names to a rename plan file for Apply Rename Plan."""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self.window, 'Export Rename Plan', PLAN_PATH, PLAN_FILTER)
+        if not path:
+            return
+
+        entries = ((clip_uid(clip), self.names[num], self.names_clean[num])
+                   for num in range(len(self.names)) for clip in self.row_clips(num))
+        try:
+            with open(path, 'w', encoding='utf-8', buffering=JOURNAL_BUFFER) as plan:
+                plan.writelines(plan_lines(entries))
+        except OSError as error:
+            self.message(f'Unable to write to {path}: {error}')
+            return
+
+        self.message(f'Exported rename plan of {self.read_count} clips to {path}.')
 
     def update_names(self):
         """Change names of the PyClips to the clean names, skip if unnecesary.
 
-        Relies on 3 lists:
-            self.selection = PyClip objects
+        Relies on 4 lists:
+            self.clips = PyClip objects
             self.names = name of the PyClip objects
             self.names_clean = cleaned up names of the above
+            self.changes = indexes of the names that differ from their clean names
+
+        Segments grouped under a row are renamed along with it, in the same pass.
         """
-        for num, clip in enumerate(self.selection):
-            if self.names[num] == self.names_clean[num]:
-                self.message(f'Skipping {self.names[num]}. No changes necessary.')
-                continue
+        renames = ((clip, self.names[num], self.names_clean[num])
+                   for num in self.changes for clip in self.row_clips(num))
+        total = self.count_clips(self.changes)
 
-            clip.name.set_value(self.names_clean[num])
-            self.message(f'Renamed {self.names[num]} to {self.names_clean[num]}.')
+        with self.timer('rename'):
+            renamed = self.commit_renames(renames, total)
 
-    def main_window(self):
-        """The main GUI window."""
+        if self.stats:
+            self.stats.count('renamed', renamed)
+
+        self.message(f'Renamed {renamed} of {total} clips. '
+                     f'{self.read_count - total} needed no changes.')
+
+    @classmethod
+    def commit_renames(cls, renames, total, record=True, run=None, action='cleanup'):
+        """Apply renames in chunks, showing a progress bar that can cancel.
+
+        Hands control back to the Qt event loop after each chunk so Flame stays
+        responsive.  Every rename is appended to the journal file through a large
+        buffer, so the disk is only touched every few thousand clips.  With record, the
+        renames are also added to JOURNAL for Revert Last Cleanup.
+
+        If a rename raises, the renames done before it are still journalled and
+        recorded, and the progress bar is closed, before the error is passed on.
 
-        def okay_button():
+        run: (optional) empty list to add the renames done to, so the caller knows
+             what was done even if an error is raised [list]
+        action: (optional) written to the journal with each rename, one of cleanup,
+                revert or plan [str]
 
-            self.window.close()
-            self.update_names()
+        Returns the number of clips renamed.
+        """
+        progress = QtWidgets.QProgressDialog('Renaming clips...', 'Cancel', 0, total)
+        progress.setWindowTitle(VERSION_TITLE)
+        progress.setWindowModality(QtCore.Qt.ApplicationModal)
+        progress.setMinimumDuration(500)
+
+        run = [] if run is None else run
+        run_id = time.strftime('%Y-%m-%dT%H:%M:%S')
+        journal = open_journal()
+
+        if journal is None:
+            cls.message(f'Unable to write to {JOURNAL_PATH}.')
+
+        try:
+            for chunk in rename_clips(renames):
+                if journal:
+                    journal.writelines(journal_lines(run_id, action, len(run), chunk))
+                run.extend(chunk)
+
+                if VERBOSE:
+                    for _, old_name, new_name in chunk:
+                        cls.message(f'Renamed {old_name} to {new_name}.')
+
+                progress.setValue(len(run))
+                QtWidgets.QApplication.processEvents()
+
+                if progress.wasCanceled():
+                    cls.message(f'Cancelled after {len(run)} of {total} clips.')
+                    break
+        finally:
+            if journal:
+                journal.close()
+
+            if record and run:
+                JOURNAL.append(run)
+                del JOURNAL[:-JOURNAL_RUNS]
+
+            progress.close()
+
+        return len(run)
+
+    def okay_button(self):
+        """Rename the clips and close the window."""
+        self.window.close()
+        self.update_names()
+        with self.timer('refresh'):
             self.refresh()
-            self.message('Done!')
+        self.message_stats('renamed')
+        self.message('Done!')
 
-        def cancel_button():
+    def cancel_button(self):
+        """Close the window without renaming anything."""
+        self.loader.stop()
+        self.window.close()
+        self.message_stats('cancelled')
+        self.message('Cancelled!')
 
-            self.window.close()
-            self.message('Cancelled!')
+    def main_window(self):
+        """Show the main GUI window with this instance's names.
 
-        self.window = QtWidgets.QWidget()
+        The widgets are built and styled the first time only.  Afterwards the same
+        window is reset and shown again.
+        """
+        if self.window is None:
+            self.build_window()
+
+        self.loader.stop()
+        CleanupName.active = self
+
+        self.list_model.set_views([
+                ([self.names_clean], None),
+                ([self.names], None),
+                ([self.names, self.names_clean], self.changes)])
+        self.list_scroll.scrollToTop()
+
+        self.view_btn.setText(self.view_selection)
+        self.preset_btn.setText(self.preset)
+        self.preset_btn.setEnabled(False)
+        self.duplicate_btn.setText(self.duplicate_selection)
+        self.duplicate_btn.setEnabled(False)
+        self.filter_timer.stop()
+        self.filter_edit.setText('')
+        self.filter_edit.setEnabled(False)
+        self.exclude_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        self.ok_btn.setEnabled(False)
+        self.count_label.setText('')
+
+        self.window.show()
+        self.window.raise_()
+        return self.window
+
+    @classmethod
+    def build_window(cls):
+        """Build the widgets of the main GUI window, shared by every instance.
+
+        Buttons act on whichever instance is active.  The style sheet is set once on
+        the window and cascades to the widgets, instead of being parsed per widget.
+        """
+        cls.window = QtWidgets.QWidget()
 
-        self.window.setMinimumSize(600, 600)
-        self.window.setStyleSheet('background-color: #272727')
-        self.window.setWindowTitle(VERSION_TITLE)
+        cls.window.setMinimumSize(700, 600)
+        cls.window.setStyleSheet(STYLESHEET)
+        cls.window.setWindowTitle(VERSION_TITLE)
 
         # FlameLineEdit class needs this
-        self.window.setFocusPolicy(QtCore.Qt.StrongFocus)
+        cls.window.setFocusPolicy(QtCore.Qt.StrongFocus)
 
         # Center Window
         resolution = QtGui.QGuiApplication.primaryScreen().availableGeometry()
 
-        self.window.move(
-                (resolution.width() / 2) - (self.window.frameSize().width() / 2),
-                (resolution.height() / 2) - (self.window.frameSize().height() / 2)
+        cls.window.move(
+                (resolution.width() / 2) - (cls.window.frameSize().width() / 2),
+                (resolution.height() / 2) - (cls.window.frameSize().height() / 2)
         )
 
         # Labels
-        self.description_label = FlameLabel('Description', 'normal')
-        self.view_label = FlameLabel('View', 'normal')
+        cls.description_label = FlameLabel('Description', 'normal')
+        cls.view_label = FlameLabel('View', 'normal')
+        cls.preset_label = FlameLabel('Preset', 'normal')
+        cls.duplicate_label = FlameLabel('Duplicates', 'normal')
+        cls.filter_label = FlameLabel('Filter', 'normal')
+        cls.count_label = FlameLabel('', 'normal')
 
         # List Widget
-        self.list_scroll = FlameListWidget(self.window)
-        self.list_scroll.addItems(self.names_clean)
+        cls.list_model = NamesModel([([[]], None)], cls.window)
+        cls.list_scroll = FlameListView(cls.window)
+        cls.list_scroll.setModel(cls.list_model)
 
         # Buttons
-        self.view_btn = FlamePushButtonMenu(self.view_selection, self.views,
-                menu_action=self.update_view)
-        self.view_btn.setMaximumWidth(100)
+        cls.view_btn = FlamePushButtonMenu(cls.views[0], cls.views,
+                menu_action=lambda: cls.active.update_view())
+        cls.view_btn.setMaximumWidth(100)
 
-        self.ok_btn = FlameButton('Ok', okay_button, button_color='blue')
-        self.ok_btn.setShortcut('Return')
+        cls.preset_btn = FlamePushButtonMenu(DEFAULT_PRESET, list(PRESETS),
+                menu_action=lambda: cls.active.update_preset())
+        cls.preset_btn.setMaximumWidth(100)
 
-        self.cancel_btn = FlameButton('Cancel', cancel_button)
+        cls.duplicate_btn = FlamePushButtonMenu(
+                next(iter(DUPLICATE_POLICIES)), list(DUPLICATE_POLICIES),
+                menu_action=lambda: cls.active.update_duplicates())
+        cls.duplicate_btn.setMaximumWidth(100)
+
+        cls.exclude_btn = FlameButton(
+                'Exclude Selected', lambda: cls.active.exclude_selected())
+
+        cls.export_btn = FlameButton('Export Plan', lambda: cls.active.export_plan())
+
+        cls.ok_btn = FlameButton(
+                'Ok', lambda: cls.active.okay_button(), button_color='blue')
+        cls.ok_btn.setShortcut('Return')
+
+        cls.cancel_btn = FlameButton('Cancel', lambda: cls.active.cancel_button())
 
         # Text
-        self.description_text = FlameTextEdit(self.description, True)
+        cls.description_text = FlameTextEdit(cls.description, True)
 
-        # Layout
-        self.grid = QtWidgets.QGridLayout()
-        self.grid.setHorizontalSpacing(10)
-        self.grid.setVerticalSpacing(10)
-
-        self.grid.addWidget(self.description_label, 0, 0, alignment=QtCore.Qt.AlignTop)
-        self.grid.addWidget(self.description_text, 0, 1)
-        self.grid.addWidget(self.view_label, 1, 0)
-        self.grid.addWidget(self.view_btn, 1, 1)
-
-        self.hbox = QtWidgets.QHBoxLayout()
-        self.hbox.addSpacing(50)
-        self.hbox.addWidget(self.list_scroll)
-        self.hbox.addSpacing(50)
-
-        self.hbox2 = QtWidgets.QHBoxLayout()
-        self.hbox2.addStretch(1)
-        self.hbox2.addWidget(self.cancel_btn)
-        self.hbox2.addWidget(self.ok_btn)
-
-        self.vbox = QtWidgets.QVBoxLayout()
-        self.vbox.setContentsMargins(20, 20, 20, 20)
-        self.vbox.addLayout(self.grid)
-        self.vbox.addSpacing(20)
-        self.vbox.addLayout(self.hbox)
-        self.vbox.addSpacing(20)
-        self.vbox.addLayout(self.hbox2)
-
-        self.window.setLayout(self.vbox)
+        cls.filter_edit = FlameLineEdit('')
+        cls.filter_edit.setPlaceholderText('Show names containing...')
 
-        self.window.show()
-        return self.window
+        cls.filter_timer = QtCore.QTimer(cls.window)
+        cls.filter_timer.setSingleShot(True)
+        cls.filter_timer.setInterval(FILTER_DELAY)
+        cls.filter_timer.timeout.connect(lambda: cls.active.update_filter())
+        cls.filter_edit.textChanged.connect(lambda: cls.filter_timer.start())
+
+        # Layout
+        cls.grid = QtWidgets.QGridLayout()
+        cls.grid.setHorizontalSpacing(10)
+        cls.grid.setVerticalSpacing(10)
+
+        cls.grid.addWidget(cls.description_label, 0, 0, alignment=QtCore.Qt.AlignTop)
+        cls.grid.addWidget(cls.description_text, 0, 1)
+        cls.grid.addWidget(cls.view_label, 1, 0)
+        cls.grid.addWidget(cls.view_btn, 1, 1)
+        cls.grid.addWidget(cls.preset_label, 2, 0)
+        cls.grid.addWidget(cls.preset_btn, 2, 1)
+        cls.grid.addWidget(cls.duplicate_label, 3, 0)
+        cls.grid.addWidget(cls.duplicate_btn, 3, 1)
+        cls.grid.addWidget(cls.filter_label, 4, 0)
+        cls.grid.addWidget(cls.filter_edit, 4, 1)
+
+        cls.hbox = QtWidgets.QHBoxLayout()
+        cls.hbox.addSpacing(50)
+        cls.hbox.addWidget(cls.list_scroll)
+        cls.hbox.addSpacing(50)
+
+        cls.count_hbox = QtWidgets.QHBoxLayout()
+        cls.count_hbox.addSpacing(50)
+        cls.count_hbox.addWidget(cls.count_label)
+        cls.count_hbox.addSpacing(50)
+
+        cls.hbox2 = QtWidgets.QHBoxLayout()
+        cls.hbox2.addWidget(cls.exclude_btn)
+        cls.hbox2.addWidget(cls.export_btn)
+        cls.hbox2.addStretch(1)
+        cls.hbox2.addWidget(cls.cancel_btn)
+        cls.hbox2.addWidget(cls.ok_btn)
+
+        cls.vbox = QtWidgets.QVBoxLayout()
+        cls.vbox.setContentsMargins(20, 20, 20, 20)
+        cls.vbox.addLayout(cls.grid)
+        cls.vbox.addSpacing(20)
+        cls.vbox.addLayout(cls.hbox)
+        cls.vbox.addLayout(cls.count_hbox)
+        cls.vbox.addSpacing(20)
+        cls.vbox.addLayout(cls.hbox2)
+
+        cls.window.setLayout(cls.vbox)
+
+        cls.loader = QtCore.QTimer(cls.window)
+        cls.loader.timeout.connect(lambda: cls.active.load_names())
+
+
+# Last selection tested by scope_clip and its result.  The selection itself is kept, so
+# the list and the Flame objects in it stay alive until the menu opens on another one.
+# Keeping only its id() is not enough, the next list Flame makes for the menu could be
+# given the id of the freed one and, if the length matched, its result.
+_last_scope = {'selection': None, 'length': 0, 'result': False}
 
 
 def scope_clip(selection):
-    """Test selection."""
+    """Test selection.
+
+    Flame calls this every time the menu opens, so the result for the last selection
+    is kept and reused while the same selection object of the same length comes back.
+    Otherwise only the distinct types in the selection are checked, stopping at the
+    first one that is not valid.
+    """
+    if (selection is _last_scope['selection']
+            and len(selection) == _last_scope['length']):
+        return _last_scope['result']
+
     valid_objects = (
             flame.PyClip,
             flame.PySegment,
+            *container_types(),
     )
 
-    return all(isinstance(item, valid_objects) for item in selection)
+    result = all(issubclass(item_type, valid_objects)
+                 for item_type in set(map(type, selection)))
+
+    _last_scope.update(selection=selection, length=len(selection), result=result)
+    return result
+
+
+def scope_journal(selection):  # pylint: disable=unused-argument
+    """Test for renames that can be reverted."""
+    return bool(JOURNAL)
+
+
+def revert_last_cleanup(selection):  # pylint: disable=unused-argument
+    """Put back the names changed by the last cleanup of the session.
+
+    Does not read the clip names first, so any clip renamed by hand since then gets its
+    name from before the cleanup as well.
+    """
+    load_ui()
+
+    run = JOURNAL[-1]
+    total = len(run)
+    reverted = []
+    renames = ((clip, new_name, old_name) for clip, old_name, new_name in reversed(run))
+
+    try:
+        CleanupName.commit_renames(renames, total, record=False, run=reverted,
+                                   action='revert')
+    finally:
+        # Only forget the renames that were put back, the rest can be tried again.
+        del run[total - len(reverted):]
+        if not run:
+            JOURNAL.pop()
+
+        CleanupName.refresh()
+        CleanupName.message(f'Reverted {len(reverted)} of {total} clips.')
+
+
+def apply_rename_plan(selection):
+    """Rename the selected clips as listed in a rename plan file.
+
+    The names in the plan are already cleaned up, so the selection is only read to
+    match the clips to the plan and no window is shown.
+    """
+    load_ui()
+
+    path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            None, 'Apply Rename Plan', PLAN_PATH, PLAN_FILTER)
+    if not path:
+        return
+
+    start_time = time.perf_counter()
+    try:
+        plan = read_plan(path)
+    except (OSError, TypeError, ValueError) as error:
+        CleanupName.message(f'Unable to read rename plan {path}: {error}')
+        return
+
+    total = count_plan_changes(plan)
+    renamed = []
+
+    try:
+        CleanupName.commit_renames(plan_renames(selection, plan), total, run=renamed,
+                                   action='plan')
+    finally:
+        CleanupName.refresh()
+        CleanupName.message(f'Renamed {len(renamed)} clips from the {total} renames '
+                            f'in {path} in {time.perf_counter() - start_time:.3f} '
+                            'seconds.')
 
 
 def get_media_panel_custom_ui_actions():
-    """Add right click menu item."""
+    """Add right click menu items."""
     return [{'name': 'Edit...',
              'actions': [{'name': 'Cleanup Name',
                           'isVisible': scope_clip,
                           'execute': CleanupName,
+                          'minimumVersion': '2025.0.0.0'},
+                         {'name': 'Apply Rename Plan',
+                          'isVisible': scope_clip,
+                          'execute': apply_rename_plan,
+                          'minimumVersion': '2025.0.0.0'},
+                         {'name': 'Revert Last Cleanup Name',
+                          'isVisible': scope_journal,
+                          'execute': revert_last_cleanup,
                           'minimumVersion': '2025.0.0.0'}]
             }]
+
+
+def read_lines(paths):
+    """Yields lines one at a time from files, or stdin for no paths or '-'."""
+    for path in paths or ['-']:
+        if path == '-':
+            yield from sys.stdin
+            continue
+
+        with open(path, encoding='utf-8', newline='') as file:
+            yield from file
+
+
+def main(argv=None):
+    """Clean up names from the command line without Flame.
+
+    Reads newline delimited names, or CSV rows with --csv, and writes the cleaned up
+    result to stdout one line or row at a time, so memory use stays constant no matter
+    how long the input is.
+    """
+    # Only needed from the command line, so kept out of the Flame hook startup.
+    import argparse
+    import csv
+    from itertools import tee
+
+    parser = argparse.ArgumentParser(
+        prog='cleanup_name.py',
+        description='Remove all symbols from names and replace whitespace with '
+                    'underscores.')
+    parser.add_argument('paths', nargs='*', metavar='FILE',
+                        help="files of names to read, '-' or none for stdin")
+    parser.add_argument('--csv', action='store_true',
+                        help='read and write CSV rows instead of plain lines')
+    parser.add_argument('--column', type=int, default=0,
+                        help='CSV column holding the name. default is 0')
+    parser.add_argument('--header', action='store_true',
+                        help='pass the first CSV row through unchanged')
+    parser.add_argument('--changed-only', action='store_true',
+                        help='only write names that would be changed')
+    parser.add_argument('--plan', action='store_true',
+                        help='write a rename plan for Apply Rename Plan instead of '
+                             'names')
+    parser.add_argument('--preset', choices=PRESETS, default=DEFAULT_PRESET,
+                        help=f'rules to apply. default is {DEFAULT_PRESET}')
+    parser.add_argument('--time-rules', action='store_true',
+                        help='print the time spent in each rule to stderr. cleans in '
+                             'one process, so cannot be used with --workers')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes to clean large inputs with, 0 for one per CPU. '
+                             'default is 1')
+    parser.add_argument('--chunk-size', type=int, default=PARALLEL_CHUNK_SIZE,
+                        help='names sent to a worker process at a time. '
+                             f'default is {PARALLEL_CHUNK_SIZE}')
+    args = parser.parse_args(argv)
+
+    if args.workers < 0:
+        parser.error('--workers must be 0 or more')
+    if args.time_rules and args.workers != 1:
+        parser.error('--time-rules cannot be used with --workers')
+
+    lines = read_lines(args.paths)
+    timings = {}
+
+    if args.csv:
+        rows = csv.reader(lines)
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        header = next(rows, None) if args.header else None
+        if header is not None and not args.plan:
+            writer.writerow(header)
+        column = args.column
+    else:
+        rows = ([line.rstrip('\r\n')] for line in lines)
+        column = 0
+
+    # Second copy of the rows to pull the names from, which may run ahead of the rows
+    # being written while the workers are busy.
+    rows, rows_ahead = tee(rows)
+    names = (row[column] if len(row) > column else '' for row in rows_ahead)
+
+    if args.time_rules:
+        names_clean = map(build_pipeline(PRESETS[args.preset], timings), names)
+    elif args.workers != 1:
+        names_clean = cleanup_parallel(
+                names, args.preset, args.workers or None, args.chunk_size)
+    else:
+        names_clean = (_clean_name(name, args.preset) for name in names)
+
+    for row, name_clean in zip(rows, names_clean):
+        # Rows too short to have a name have nothing to change or plan.
+        if len(row) <= column:
+            if not (args.plan or args.changed_only):
+                writer.writerow(row)
+            continue
+
+        # Renames and plans leave a name that cleans up to nothing as it is, like in
+        # Flame.  Otherwise the cleaned up name is written, even if it is empty.
+        if not name_clean and (args.plan or args.changed_only):
+            name_clean = row[column]
+
+        if args.changed_only and name_clean == row[column]:
+            continue
+
+        if args.plan:
+            sys.stdout.writelines(plan_lines([(None, row[column], name_clean)]))
+        elif args.csv:
+            row[column] = name_clean
+            writer.writerow(row)
+        else:
+            sys.stdout.write(name_clean + '\n')
+
+    for rule, seconds in timings.items():
+        sys.stderr.write(f'{rule}: {seconds:.3f} seconds\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Runs cleanup_name outside of Flame, with a stand-in flame and offscreen Qt."""
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path[:0] = [TESTS_DIR, os.path.dirname(TESTS_DIR)]
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import cleanup_name  # pylint: disable=wrong-import-position
+
+# Name, number of clips and best time of each benchmark, printed at the end of the run.
+BENCHMARKS = []
+
+# PySide6 versions that release a reference to None on every call that returns nothing.
+# Before None was made immortal in Python 3.12, a long run frees None and aborts.
+PYSIDE_NONE_LEAKS = [(6, 12, 0)]
+
+
+@pytest.fixture(autouse=True)
+def user_dir(tmp_path, monkeypatch):
+    """Keep the journal and plans of each test in its own folder, with empty caches."""
+    monkeypatch.setattr(cleanup_name, 'USER_DIR', str(tmp_path))
+    monkeypatch.setattr(cleanup_name, 'JOURNAL_PATH', str(tmp_path / 'journal.jsonl'))
+    monkeypatch.setattr(cleanup_name, 'PLAN_PATH', str(tmp_path / 'plan.jsonl'))
+    monkeypatch.setattr(cleanup_name, 'JOURNAL', [])
+    cleanup_name._clean_name.cache_clear()  # pylint: disable=protected-access
+    return tmp_path
+
+
+@pytest.fixture
+def qt_app():
+    """The QApplication, with the Qt parts of cleanup_name loaded."""
+    pyside = pytest.importorskip('PySide6')
+    if (sys.version_info < (3, 12)
+            and tuple(pyside.__version_info__[:3]) in PYSIDE_NONE_LEAKS):
+        pytest.skip(f'PySide6 {pyside.__version__} frees None on Python 3.11 and older')
+
+    cleanup_name.load_ui()
+    app = cleanup_name.QtWidgets.QApplication.instance()
+    return app or cleanup_name.QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def open_window(qt_app, capsys):
+    """Returns a function opening the window on a selection, waiting for it to load."""
+    def open_window(selection):
+        window = cleanup_name.CleanupName(selection)
+        while not window.ok_btn.isEnabled():
+            qt_app.processEvents()
+        capsys.readouterr()
+        return window
+
+    return open_window
+
+
+def pytest_terminal_summary(terminalreporter):
+    if BENCHMARKS:
+        terminalreporter.section('benchmarks, best time')
+        for name, count, seconds in BENCHMARKS:
+            terminalreporter.write_line(
+                    f'{name:20s} {count:9,d} {seconds * 1000:12.1f} ms '
+                    f'{count / seconds:14,.0f} per second')
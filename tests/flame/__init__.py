@@ -0,0 +1,90 @@
+"""Stand-in for the flame module, with just the parts of the API Cleanup Name uses.
+
+Lets cleanup_name be imported and its window run outside of Flame, for the tests and
+benchmarks.  Only found when the tests folder is on sys.path, as conftest.py puts it.
+"""
+
+shortcuts = []
+
+
+class PyAttribute:
+    """Attribute with a value, like the name of a clip."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+    def set_value(self, value):
+        self.value = value
+        return True
+
+
+class PyClip:
+    """Clip with a name and, optionally, a unique id."""
+
+    def __init__(self, name, uid=None):
+        self.name = PyAttribute(name)
+        self.uid = PyAttribute(uid)
+
+
+class PySegment(PyClip):
+    """Segment on a track of a sequence."""
+
+
+class PyTrack:
+    """Track of a version, holding segments."""
+
+    def __init__(self, segments=()):
+        self.segments = list(segments)
+
+
+class PyVersion:
+    """Version of a sequence, holding tracks."""
+
+    def __init__(self, tracks=()):
+        self.tracks = list(tracks)
+
+
+class PySequence(PyClip):
+    """Sequence, holding versions."""
+
+    def __init__(self, name, uid=None, versions=()):
+        super().__init__(name, uid)
+        self.versions = list(versions)
+
+
+class PyContainer:
+    """Base of the Media Panel containers.  Keywords become attributes, like clips."""
+
+    def __init__(self, name, **contents):
+        self.name = PyAttribute(name)
+        for attribute, items in contents.items():
+            setattr(self, attribute, list(items))
+
+
+class PyDesktop(PyContainer):
+    pass
+
+
+class PyLibrary(PyContainer):
+    pass
+
+
+class PyFolder(PyContainer):
+    pass
+
+
+class PyReelGroup(PyContainer):
+    pass
+
+
+class PyReel(PyContainer):
+    pass
+
+
+def execute_shortcut(description):
+    """Records the shortcut instead of running it."""
+    shortcuts.append(description)
+    return True
@@ -0,0 +1,200 @@
+"""Timings of the rename pipeline and its parts, on up to 100,000 clips.
+
+Each case is run REPEATS times on fresh clips with an empty name cache, and the best
+time is checked against a threshold about ten times what it takes on a workstation,
+so only a real regression fails.  The best times, and the names or clips per second,
+are printed at the end of the run.
+"""
+
+import itertools
+import re
+import time
+
+import pytest
+
+import flame
+import cleanup_name as cn
+from conftest import BENCHMARKS
+
+REPEATS = 3
+
+# Most seconds each case may take, by number of clips.
+PIPELINE_LIMITS = {100: 0.05, 10_000: 1.0, 100_000: 10.0}
+WINDOW_LIMITS = {100: 0.5, 10_000: 3.0, 100_000: 30.0}
+
+# Most seconds scope_clip may take to test a new selection when the menu opens, by
+# number of clips.
+SCOPE_LIMITS = {100: 0.002, 10_000: 0.01, 100_000: 0.05}
+
+# Most seconds renaming the clips may take through the window, or by applying a rename
+# plan, by number of clips.
+PLAN_LIMITS = {10_000: 1.5, 100_000: 10.0}
+
+# Most seconds the names may take to clean a chunk at a time, as the window loads them,
+# without and with the disk cache, by number of clips.
+DISK_CACHE_LIMITS = {10_000: 1.0, 100_000: 10.0}
+
+# Most seconds cleanup_parallel may take on PARALLEL_MINIMUM names, by number of
+# workers.  Only the time is checked, the speed up depends on the CPUs of the machine.
+PARALLEL_LIMITS = {1: 10.0, 2: 10.0, 4: 10.0}
+
+
+def make_clips(count):
+    """Returns the same mix of clips every time, with some accents and duplicates."""
+    clips = []
+    for num in range(count):
+        if num % 50 == 0:
+            name = f'Shot {num // 100:04d} plate'
+        elif num % 10 == 0:
+            name = f'Plán Ñoño {num:06d} — éclair v{num % 7:03d}'
+        else:
+            name = f'Shot {num:06d} comp v{num % 7:03d}!! (final)'
+        clips.append(flame.PyClip(name))
+    return clips
+
+
+def best_time(name, run, count, repeats=REPEATS):
+    """Returns the best time of run(clips) over repeats, each with fresh clips."""
+    times = []
+    for _ in range(repeats):
+        clips = make_clips(count)
+        cn._clean_name.cache_clear()  # pylint: disable=protected-access
+        start = time.perf_counter()
+        run(clips)
+        times.append(time.perf_counter() - start)
+
+    BENCHMARKS.append((name, count, min(times)))
+    return min(times)
+
+
+def regex_cleanup(text):
+    """The name cleanup from before it was precompiled, three regex passes per name."""
+    chopped = re.sub(r'^[\W_]+|[\W_]+$', '', text)
+    sanitized = re.sub(r'\W+', '_', chopped)
+    return re.sub(r'(_)\1+', '_', sanitized)
+
+
+def pipeline(clips):
+    """Read, clean, find duplicates of and rename the clips, without the window."""
+    names = [clip.name.get_value() for clip in clips]
+    names_clean = cn.cleanup_many(names, 'ASCII')
+    names_clean = cn.add_suffixes(
+            names, names_clean, cn.find_collisions(names_clean), '_{:03d}', 1)
+    renames = ((clips[num], names[num], names_clean[num])
+               for num in cn.find_changes(names, names_clean))
+    for _ in cn.rename_clips(renames):
+        pass
+
+
+def test_cleanup_many_against_regex():
+    count = 100_000
+
+    def run_regex(clips):
+        return [regex_cleanup(clip.name.get_value()) for clip in clips]
+
+    def run_cleanup_many(clips):
+        return cn.cleanup_many(clip.name.get_value() for clip in clips)
+
+    regex = best_time('regex cleanup', run_regex, count)
+    assert best_time('cleanup_many', run_cleanup_many, count) < regex
+
+
+@pytest.mark.parametrize('count', PIPELINE_LIMITS)
+def test_pipeline(count):
+    assert best_time('pipeline', pipeline, count) < PIPELINE_LIMITS[count]
+
+
+@pytest.mark.parametrize('count', SCOPE_LIMITS)
+def test_scope_clip(count, monkeypatch):
+    monkeypatch.setattr(cn, '_last_scope', {'selection': None, 'length': 0,
+                                            'result': False})
+
+    assert best_time('menu open', cn.scope_clip, count) < SCOPE_LIMITS[count]
+
+    # Flame asks again with the same selection, the result is reused.
+    clips = make_clips(count)
+    cn.scope_clip(clips)
+    start = time.perf_counter()
+    cn.scope_clip(clips)
+    BENCHMARKS.append(('menu open again', count, time.perf_counter() - start))
+
+
+def cleanup_chunks(cleanup_many):
+    """Returns a run that cleans the clip names a chunk at a time with cleanup_many."""
+    def run(clips):
+        names = [clip.name.get_value() for clip in clips]
+        for start in range(0, len(names), cn.CHUNK_SIZE):
+            cleanup_many(names[start:start + cn.CHUNK_SIZE], 'ASCII')
+
+    return run
+
+
+@pytest.mark.parametrize('count', DISK_CACHE_LIMITS)
+def test_disk_cache(count, user_dir):
+    paths = (str(user_dir / f'cache{num}.sqlite') for num in itertools.count())
+
+    def cold(clips):
+        cache = cn.DiskCache(next(paths), cn.DISK_CACHE_SIZE)
+        cleanup_chunks(cache.cleanup_many)(clips)
+
+    # A new session on a database that has every name already.
+    warm_path = next(paths)
+    cold(make_clips(count))
+
+    def warm(clips):
+        cache = cn.DiskCache(warm_path, cn.DISK_CACHE_SIZE)
+        cleanup_chunks(cache.cleanup_many)(clips)
+
+    limit = DISK_CACHE_LIMITS[count]
+    assert best_time('no disk cache', cleanup_chunks(cn.cleanup_many), count) < limit
+    assert best_time('disk cache cold', cold, count) < limit
+    assert best_time('disk cache warm', warm, count) < limit
+
+
+@pytest.mark.parametrize('workers', PARALLEL_LIMITS)
+def test_cleanup_parallel(workers):
+    def run(clips):
+        names = (clip.name.get_value() for clip in clips)
+        return list(cn.cleanup_parallel(names, 'ASCII', workers))
+
+    seconds = best_time(f'parallel x{workers}', run, cn.PARALLEL_MINIMUM, repeats=1)
+    assert seconds < PARALLEL_LIMITS[workers]
+
+
+@pytest.mark.parametrize('count', WINDOW_LIMITS)
+def test_window(count, open_window, capsys):
+    def run(clips):
+        window = open_window(clips)
+        window.view_btn.setText('Changes')
+        window.update_view()
+        window.window.close()
+        window.update_names()
+        capsys.readouterr()
+
+        assert clips[1].name.get_value() != make_clips(2)[1].name.get_value()
+
+    assert best_time('window', run, count) < WINDOW_LIMITS[count]
+
+
+@pytest.mark.parametrize('count', PLAN_LIMITS)
+def test_apply_plan(count, open_window, capsys, user_dir, monkeypatch):
+    names = [clip.name.get_value() for clip in make_clips(count)]
+    path = user_dir / 'plan.jsonl'
+    path.write_text(''.join(cn.plan_lines(
+            (None, name, name_clean)
+            for name, name_clean in zip(names, cn.cleanup_many(names)))))
+    monkeypatch.setattr(cn.QtWidgets.QFileDialog, 'getOpenFileName',
+                        lambda *args: (str(path), ''))
+
+    def interactive(clips):
+        open_window(clips).okay_button()
+        capsys.readouterr()
+
+    def apply_plan(clips):
+        cn.apply_rename_plan(clips)
+        capsys.readouterr()
+
+        assert clips[1].name.get_value() != names[1]
+
+    assert best_time('window and Ok', interactive, count) < PLAN_LIMITS[count]
+    assert best_time('apply plan', apply_plan, count) < PLAN_LIMITS[count]
@@ -0,0 +1,511 @@
+"""Tests of the name rules, rename plans, journal and window with the stand-in flame."""
+
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import flame
+import cleanup_name as cn
+from conftest import TESTS_DIR
+
+
+class BrokenClip(flame.PyClip):
+    """Clip that cannot be renamed, like one deleted while the window is open."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.name.set_value = self.fail
+
+    @staticmethod
+    def fail(value):
+        raise RuntimeError(f'Unable to rename to {value}')
+
+
+def names_of(clips):
+    return [clip.name.get_value() for clip in clips]
+
+
+def journal_entries():
+    with open(cn.JOURNAL_PATH, encoding='utf-8') as journal:
+        return [json.loads(line) for line in journal]
+
+
+def sanitize_regex(text):
+    """The sanitizer from before the ASCII fast path, three regex passes."""
+    chopped = re.sub(r'^[\W_]+|[\W_]+$', '', text)
+    sanitized = re.sub(r'\W+', '_', chopped)
+    return re.sub(r'(_)\1+', '_', sanitized)
+
+
+def test_import_leaves_out_qt_and_command_line():
+    code = 'import sys, cleanup_name; print(" ".join(sys.modules))'
+    result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code], capture_output=True,
+            check=True, cwd=os.path.dirname(TESTS_DIR), text=True,
+            env={**os.environ, 'PYTHONPATH': TESTS_DIR})
+    modules = set(result.stdout.split())
+
+    assert '| cleanup_name' in result.stderr
+    assert 'flame' in modules
+    assert not modules & {'PySide6', 'argparse', 'csv', 'concurrent.futures'}
+
+
+@pytest.mark.parametrize('name, preset, expected', [
+    ('Shot 010 (final)!', 'Default', 'Shot_010_final'),
+    ('__a  -  b__', 'Default', 'a_b'),
+    ('Crème brûlée v003', 'ASCII', 'Creme_brulee_v003'),
+    ('Straße', 'ASCII', 'Strasse'),
+    ('Łódź', 'ASCII', 'Lodz'),
+    ('Øresund æble', 'ASCII', 'Oresund_aeble'),
+    ('漢字', 'ASCII', ''),
+    ('Shot A v003', 'ASCII Lowercase', 'shot_a_v003'),
+    ('shot a v003', 'ASCII Uppercase', 'SHOT_A_v003'),
+])
+def test_cleanup_text(name, preset, expected):
+    assert cn.cleanup_text(name, preset) == expected
+
+
+def test_cleanup_text_cache_keys():
+    cn.cleanup_text('a b')
+    cn.cleanup_text('a b', 'Default')
+    cn.cleanup_text('a b', preset='Default')
+    cn.cleanup_many(['a b'])
+
+    info = cn._clean_name.cache_info()  # pylint: disable=protected-access
+    assert (info.hits, info.misses) == (3, 1)
+
+
+def test_sanitize_matches_regex():
+    # Half of the names take the ASCII fast path.  The rest also have accented and other
+    # letters, combining marks and more underscores, which go through the regex.
+    ascii_characters = [chr(num) for num in range(128)]
+    characters = ascii_characters + list('éßŁøæ漢字Ωя\u0301\u0308___')
+    generator = random.Random(1)
+
+    for num in range(50000):
+        name = ''.join(generator.choices(characters if num % 2 else ascii_characters,
+                                         k=generator.randint(0, 24)))
+        assert cn.sanitize(name) == sanitize_regex(name), repr(name)
+
+
+@pytest.mark.parametrize('name', [
+    'a' * 70 + '_v003',
+    'v' + '1' * 80,
+    'a_v' + '1' * 63,
+    'a' * 100,
+])
+def test_truncate(name):
+    result = cn.truncate(name)
+
+    assert len(result) <= cn.MAX_LENGTH
+    if name.endswith('_v003'):
+        assert result.endswith('_v003')
+
+
+def test_find_changes_and_collisions_skip_empty_names():
+    names = ['漢字', '漢字', 'Shot 1']
+    names_clean = cn.cleanup_many(names, 'ASCII')
+
+    assert list(cn.find_changes(names, names_clean)) == [2]
+    assert not cn.find_collisions(names_clean)
+
+
+def test_add_suffixes_keeps_clean_name():
+    names = ['Shot 010', 'Shot_010', 'Shot 010', 'Shot_010_001']
+    names_clean = cn.cleanup_many(names)
+    collisions = cn.find_collisions(names_clean)
+
+    assert cn.add_suffixes(names, names_clean, collisions, '_{:03d}', 1) == [
+            'Shot_010_002', 'Shot_010', 'Shot_010_003', 'Shot_010_001']
+
+
+def test_cleanup_parallel_keeps_order(monkeypatch):
+    monkeypatch.setattr(cn, 'PARALLEL_MINIMUM', 100)
+    names = [f'Plán {num} v{num % 7:03d}!' for num in range(1000)]
+
+    assert list(cn.cleanup_parallel(names, 'ASCII', workers=2, chunk_size=64)) == (
+            cn.cleanup_many(names, 'ASCII'))
+
+
+def test_cleanup_parallel_skips_disk_cache(monkeypatch, user_dir):
+    monkeypatch.setattr(cn, 'DISK_CACHE', True)
+    monkeypatch.setattr(cn, '_disk_cache',
+                        cn.DiskCache(str(user_dir / 'cache.sqlite'), 100))
+    monkeypatch.setattr(cn, 'PARALLEL_MINIMUM', 100)
+    names = [f'Shot {num}' for num in range(1000)]
+
+    assert list(cn.cleanup_parallel(names, workers=2, chunk_size=64)) == (
+            cn.cleanup_many(names))
+    assert list(cn.cleanup_parallel(names[:10], workers=2)) == (
+            cn.cleanup_many(names[:10]))
+    assert not (user_dir / 'cache.sqlite').exists()
+
+
+def test_cleanup_parallel_short_input_stays_in_process(monkeypatch):
+    def no_executor(*args):
+        raise AssertionError('Started worker processes')
+
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', no_executor)
+    names = [f'Shot {num}' for num in range(1000)]
+
+    assert list(cn.cleanup_parallel(names, workers=2)) == cn.cleanup_many(names)
+
+
+def test_expand_selection():
+    segments = [flame.PySegment('plate 010'), flame.PySegment('comp 020')]
+    sequence = flame.PySequence('edit', versions=[flame.PyVersion(
+            [flame.PyTrack(segments[:1]), flame.PyTrack(segments[1:])])])
+    clip = flame.PyClip('clip')
+    library = flame.PyLibrary(
+            'library', clips=[clip],
+            folders=[flame.PyFolder('folder', sequences=[sequence])])
+
+    result = list(cn.expand_selection([library, clip, segments[0]]))
+
+    assert result == [clip, sequence, *segments]
+
+
+def test_expand_selection_by_uid_and_past_none():
+    clips = [flame.PyClip('one', 'uid1'), flame.PyClip('two'), flame.PyClip('three')]
+    library = flame.PyLibrary('library', clips=[flame.PyClip('one', 'uid1'), None,
+                                                *clips[1:]])
+
+    assert list(cn.expand_selection([clips[0], library, clips[1]])) == clips
+
+
+def test_scope_clip(monkeypatch):
+    monkeypatch.setattr(cn, '_last_scope', {'selection': None, 'length': 0,
+                                            'result': False})
+    clips = [flame.PyClip('clip'), flame.PySegment('segment'),
+             flame.PyLibrary('library')]
+
+    assert cn.scope_clip(clips)
+    monkeypatch.setattr(cn, 'container_types', lambda: ())
+    assert cn.scope_clip(clips)
+    assert not cn.scope_clip(list(clips))
+
+    assert not cn.scope_clip([flame.PyClip('clip'), flame.PyTrack()])
+    assert not cn.scope_clip([flame.PyAttribute('name')])
+
+
+def test_plan_round_trip_with_duplicates(user_dir):
+    clips = [flame.PyClip(name) for name in ['Shot 010'] * 3 + ['Shot_010']]
+    names = names_of(clips)
+    names_clean = cn.cleanup_many(names)
+    names_clean = cn.add_suffixes(
+            names, names_clean, cn.find_collisions(names_clean), '_{:03d}', 1)
+
+    path = user_dir / 'plan.jsonl'
+    path.write_text(''.join(cn.plan_lines(
+            (None, name, name_clean) for name, name_clean in zip(names, names_clean))))
+    plan = cn.read_plan(path)
+
+    assert cn.count_plan_changes(plan) == 3
+    for clip, old_name, new_name in cn.plan_renames(clips, plan):
+        clip.name.set_value(new_name)
+    assert names_of(clips) == [
+            'Shot_010_001', 'Shot_010_002', 'Shot_010_003', 'Shot_010']
+
+
+def test_main_plan_skips_header_and_short_rows(user_dir, capsys):
+    path = user_dir / 'names.csv'
+    path.write_text('id,name\n1,Shot 010\n2\n3,Shot_020\n', encoding='utf-8')
+
+    cn.main(['--csv', '--header', '--column', '1', '--plan', str(path)])
+    lines = capsys.readouterr().out.splitlines()
+
+    assert [json.loads(line) for line in lines] == [
+            [None, 'Shot 010', 'Shot_010', True],
+            [None, 'Shot_020', 'Shot_020', False]]
+
+
+def test_main_changed_only_skips_short_rows(user_dir, capsys):
+    path = user_dir / 'names.csv'
+    path.write_text('id,name\n1,Shot 010\n2\n3,Shot_020\n', encoding='utf-8')
+
+    cn.main(['--csv', '--header', '--column', '1', '--changed-only', str(path)])
+
+    assert capsys.readouterr().out == 'id,name\n1,Shot_010\n'
+
+
+@pytest.mark.parametrize('options, expected', [
+    ([], '\nShot_010\n'),
+    (['--changed-only'], 'Shot_010\n'),
+    (['--plan'], '[null,"!!!","!!!",false]\n[null,"Shot 010","Shot_010",true]\n'),
+])
+def test_main_name_that_cleans_to_nothing(user_dir, capsys, options, expected):
+    path = user_dir / 'names.txt'
+    path.write_text('!!!\nShot 010\n', encoding='utf-8')
+
+    cn.main([*options, str(path)])
+
+    assert capsys.readouterr().out == expected
+
+
+@pytest.mark.parametrize('options', [
+    ['--workers', '-1'],
+    ['--time-rules', '--workers', '2'],
+])
+def test_main_rejects_workers(user_dir, capsys, options):
+    path = user_dir / 'names.txt'
+    path.write_text('Shot 010\n', encoding='utf-8')
+
+    with pytest.raises(SystemExit):
+        cn.main([*options, str(path)])
+
+    assert capsys.readouterr().out == ''
+
+
+def test_journal_rotation(monkeypatch):
+    monkeypatch.setattr(cn, 'JOURNAL_SIZE', 10)
+    for num in range(5):
+        journal = cn.open_journal()
+        journal.write(f'{num:020d}\n')
+        journal.close()
+
+    assert [int(open(f'{cn.JOURNAL_PATH}{suffix}', encoding='utf-8').read())
+            for suffix in ('', '.1', '.2', '.3')] == [4, 3, 2, 1]
+
+
+def test_disk_cache(user_dir, capsys):
+    path = str(user_dir / 'cache.sqlite')
+    names = ['Shot 010', 'Shot 020', 'Shot 010']
+
+    assert cn.DiskCache(path, 100).cleanup_many(names, 'Default') == [
+            'Shot_010', 'Shot_020', 'Shot_010']
+    assert cn.DiskCache(path, 100).cleanup_many(names, 'Default') == [
+            'Shot_010', 'Shot_020', 'Shot_010']
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT count(*) FROM names').fetchone() == (2,)
+
+    cache = cn.DiskCache(str(user_dir / 'missing' / 'file' / 'cache.sqlite'), 100)
+    (user_dir / 'missing').write_text('not a folder')
+    assert cache.cleanup_many(names, 'Default') == ['Shot_010', 'Shot_020', 'Shot_010']
+    assert not cache.usable
+    assert 'Disk cache turned off' in capsys.readouterr().out
+
+
+def test_window_renames_and_journals(open_window, qt_app):
+    clips = [flame.PyClip('Shot 010', 'uid1'), flame.PyClip('Shot_020'),
+             flame.PyClip('Shot 030')]
+    window = open_window(clips)
+    window.ok_btn.click()
+    qt_app.processEvents()
+
+    assert names_of(clips) == ['Shot_010', 'Shot_020', 'Shot_030']
+    assert [entry[1:] for entry in journal_entries()] == [
+            ['cleanup', 0, 'uid1', 'Shot 010', 'Shot_010'],
+            ['cleanup', 1, None, 'Shot 030', 'Shot_030']]
+
+    cn.revert_last_cleanup([])
+
+    assert names_of(clips) == ['Shot 010', 'Shot_020', 'Shot 030']
+    assert [entry[1] for entry in journal_entries()] == ['cleanup'] * 2 + ['revert'] * 2
+    assert not cn.JOURNAL
+
+
+def test_window_filter_narrows(open_window):
+    clips = [flame.PyClip(name) for name in
+             ['Shot 010', 'Shot 020', 'Plate 010', 'shot 011', 'Comp']]
+    window = open_window(clips)
+
+    window.filter_edit.setText('SHOT')
+    window.update_filter()
+    assert window.filter_rows == [0, 1, 3]
+    assert window.list_model.rowCount() == 3
+
+    # Typing more only searches the rows already shown.
+    window.search_index[2] = 'shot_01'
+    window.filter_edit.setText('shot_01')
+    window.update_filter()
+    assert window.filter_rows == [0, 3]
+
+    window.update_search_index()
+    window.filter_edit.setText('010')
+    window.update_filter()
+    assert window.filter_rows == [0, 2]
+
+    window.filter_edit.setText('')
+    window.update_filter()
+    assert window.filter_rows is None
+    assert window.list_model.rowCount() == 5
+
+
+def select_rows(window, *rows):
+    selection = window.list_scroll.selectionModel()
+    selection.clearSelection()
+    for row in rows:
+        selection.select(window.list_model.index(row, 0),
+                         cn.QtCore.QItemSelectionModel.Select
+                         | cn.QtCore.QItemSelectionModel.Rows)
+
+
+def test_window_exclude_selected(open_window):
+    clips = [flame.PyClip(name) for name in ['Shot 010', 'Shot 020', 'Shot 030']]
+    window = open_window(clips)
+    window.view_btn.setText('Changes')
+    window.update_view()
+
+    select_rows(window, 1)
+    window.exclude_selected()
+
+    assert window.changes == [0, 2]
+    assert window.names_clean == ['Shot_010', 'Shot 020', 'Shot_030']
+    assert window.list_model.rowCount() == 2
+
+    window.filter_edit.setText('030')
+    window.update_filter()
+    select_rows(window, 0)
+    window.exclude_selected()
+
+    assert window.changes == [0]
+
+
+@pytest.mark.parametrize('names, expected', [
+    (['Shot 010', 'Shot 010', 'Shot 010'],
+     ['Shot 010', 'Shot_010', 'Shot_010_001']),
+    (['Shot_010', 'Shot 010', 'Shot 010'],
+     ['Shot_010', 'Shot_010_001', 'Shot_010_002']),
+])
+def test_window_exclude_keeper_of_duplicates(open_window, names, expected):
+    window = open_window([flame.PyClip(name) for name in names])
+    window.duplicate_btn.setText('Add _001')
+    window.update_duplicates()
+
+    select_rows(window, 0)
+    window.exclude_selected()
+
+    assert window.names_clean == expected
+
+
+@pytest.fixture
+def stats_log(user_dir, monkeypatch):
+    """Turn on the run stats, logged to a file that rotates after every line."""
+    path = user_dir / 'stats.jsonl'
+    monkeypatch.setattr(cn, 'STATS', True)
+    monkeypatch.setattr(cn, 'STATS_LOG', str(path))
+    monkeypatch.setattr(cn, 'STATS_LOG_SIZE', 100)
+    yield path
+
+    logger = logging.getLogger('cleanup_name.stats')
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+
+def stats_lines(output):
+    return [json.loads(line.split(' ', 1)[1]) for line in output.splitlines()
+            if line.startswith(f'{cn.MESSAGE_PREFIX} {{')]
+
+
+def test_stats_off(open_window, capsys, monkeypatch):
+    monkeypatch.setattr(cn, 'STATS', False)
+    window = open_window([flame.PyClip('Shot 010'), flame.PyClip('Shot_020')])
+    window.okay_button()
+
+    assert not stats_lines(capsys.readouterr().out)
+
+
+def test_stats_printed_and_logged(open_window, capsys, stats_log):
+    for outcome in ['renamed', 'cancelled', 'cancelled']:
+        window = open_window([flame.PyClip('Shot 010'), flame.PyClip('Shot_020')])
+        if outcome == 'renamed':
+            window.okay_button()
+        else:
+            window.cancel_button()
+
+        lines = stats_lines(capsys.readouterr().out)
+        assert len(lines) == 1
+        assert lines[0]['outcome'] == outcome
+        assert (lines[0]['clips'], lines[0]['changed']) == (2, 1)
+        assert 'fetch' in lines[0]['seconds']
+
+    logs = [json.loads(open(f'{stats_log}{suffix}', encoding='utf-8').read())
+            for suffix in ('', '.1', '.2')]
+    assert [line['outcome'] for line in logs] == ['cancelled', 'cancelled', 'renamed']
+
+
+def test_window_counts_grouped_segments(open_window, capsys, stats_log):
+    segments = [flame.PySegment(name) for name in ['plate 1'] * 3 + ['comp']]
+    window = open_window(segments)
+
+    assert len(window.names) == 2
+    assert window.count_label.text() == '3 changed, 1 unchanged, 0 duplicates'
+
+    window.okay_button()
+    output = capsys.readouterr().out
+    stats = stats_lines(output)[0]
+
+    assert 'Renamed 3 of 3 clips. 1 needed no changes.' in output
+    assert (stats['clips'], stats['changed'], stats['skipped']) == (4, 3, 1)
+    assert names_of(segments) == ['plate_1'] * 3 + ['comp']
+
+
+def test_failed_rename_is_journalled(qt_app):
+    clips = [flame.PyClip(f'Shot {num}') for num in range(3)] + [BrokenClip('Shot 3')]
+    renames = [(clip, clip.name.get_value(), f'Shot_{num}')
+               for num, clip in enumerate(clips)]
+
+    with pytest.raises(RuntimeError):
+        cn.CleanupName.commit_renames(renames, len(renames))
+
+    assert len(cn.JOURNAL) == 1
+    assert len(cn.JOURNAL[0]) == 3
+    assert len(journal_entries()) == 3
+
+
+def test_journal_keeps_last_runs(qt_app, monkeypatch):
+    monkeypatch.setattr(cn, 'JOURNAL_RUNS', 3)
+    clips = [flame.PyClip(f'Shot {num}') for num in range(5)]
+
+    for num, clip in enumerate(clips):
+        cn.CleanupName.commit_renames([(clip, f'Shot {num}', f'Shot_{num}')], 1)
+
+    assert [run[0][0] for run in cn.JOURNAL] == clips[2:]
+    assert len(journal_entries()) == 5
+
+
+def test_plan_export_and_apply_with_duplicates(open_window, qt_app, user_dir,
+                                                monkeypatch):
+    clips = [flame.PyClip(name) for name in ['Shot 010'] * 3 + ['Shot_010']]
+    path = str(user_dir / 'plan.jsonl')
+    dialog = cn.QtWidgets.QFileDialog
+    monkeypatch.setattr(dialog, 'getSaveFileName', lambda *args: (path, ''))
+    monkeypatch.setattr(dialog, 'getOpenFileName', lambda *args: (path, ''))
+
+    window = open_window(clips)
+    window.duplicate_btn.setText('Add _001')
+    window.update_duplicates()
+    window.export_plan()
+    window.cancel_button()
+    qt_app.processEvents()
+    cn.apply_rename_plan(clips)
+
+    assert names_of(clips) == [
+            'Shot_010_001', 'Shot_010_002', 'Shot_010_003', 'Shot_010']
+    assert {entry[1] for entry in journal_entries()} == {'plan'}
+
+
+def test_failed_plan_still_refreshes(qt_app, user_dir, monkeypatch, capsys):
+    clips = [flame.PyClip(f'Shot {num}') for num in range(2)] + [BrokenClip('Shot 2')]
+    path = user_dir / 'plan.jsonl'
+    path.write_text(''.join(cn.plan_lines(
+            (None, f'Shot {num}', f'Shot_{num}') for num in range(3))))
+    dialog = cn.QtWidgets.QFileDialog
+    monkeypatch.setattr(dialog, 'getOpenFileName', lambda *args: (str(path), ''))
+    monkeypatch.setattr(flame, 'shortcuts', [])
+
+    with pytest.raises(RuntimeError):
+        cn.apply_rename_plan(clips)
+
+    assert flame.shortcuts == ['Refresh Thumbnails']
+    assert 'Renamed 2 clips from the 3 renames' in capsys.readouterr().out
+    assert len(journal_entries()) == 2